@@ -0,0 +1,21 @@
+"""Which configured caches can hold state that every worker must agree on.
+
+A local-memory cache lives inside one process. An entry another worker
+wrote, changed or deleted is invisible to it, so anything that is only
+right while all workers see the same entry (who is logged in, whether a
+timer is running) may only be cached in a shared backend such as Redis,
+Memcached, the database or files.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(cache):
+  """Whether all worker processes read and write the same entries"""
+  return not isinstance(cache, LocMemCache)
+
+
+def shared_cache(alias):
+  """The cache ``alias`` if it is shared between processes, otherwise None"""
+  cache = caches[alias]
+  return cache if is_shared(cache) else None
@@ -0,0 +1,87 @@
+"""Database settings for each deployment profile and engine.
+
+"development" is Django's plain SQLite setup. "production" tunes SQLite for
+several workers writing at once:
+
+- WAL journaling, so readers never block the writer or each other, with
+  synchronous=NORMAL, which only syncs at checkpoints. A power cut can
+  lose the last commits but never corrupts the file.
+- A busy timeout, so a writer waits for the lock instead of failing with
+  "database is locked", and IMMEDIATE transactions. Those take the write
+  lock when they begin. A deferred transaction that reads first and then
+  writes can be refused the lock without waiting at all.
+- A larger page cache and memory-mapped reads.
+- Persistent connections, so each request does not open the file and run
+  the pragmas again.
+
+PostgreSQL connections come from psycopg's pool, which Django 5.1+ manages
+itself. A connection goes back to the pool at the end of each request
+instead of being closed. requirements-postgresql.txt installs psycopg with
+its pool extra.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('development', 'production')
+
+# The DATABASES alias of the read replica, when there is one
+REPLICA = 'replica'
+
+SQLITE_PRAGMAS = {
+  'journal_mode': 'WAL',
+  'synchronous': 'NORMAL',
+  # In KiB when negative
+  'cache_size': -64 * 1024,
+  'mmap_size': 256 * 1024 * 1024,
+  'temp_store': 'MEMORY',
+}
+
+# Seconds a connection waits for another one's write lock
+SQLITE_BUSY_TIMEOUT = 20
+
+CONN_MAX_AGE = 600
+
+
+def sqlite_database(name, profile='development'):
+  """The DATABASES entry for an SQLite file under the given profile"""
+  if profile not in PROFILES:
+    raise ImproperlyConfigured(f'DATABASE_PROFILE must be one of {", ".join(PROFILES)}, not {profile!r}')
+  database = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': name,
+  }
+  if profile == 'production':
+    database.update({
+      'CONN_MAX_AGE': CONN_MAX_AGE,
+      'CONN_HEALTH_CHECKS': True,
+      'OPTIONS': {
+        'timeout': SQLITE_BUSY_TIMEOUT,
+        'transaction_mode': 'IMMEDIATE',
+        # Run by Django on every new connection
+        'init_command': ';'.join(f'PRAGMA {pragma} = {value}' for pragma, value in SQLITE_PRAGMAS.items()),
+      },
+    })
+  return database
+
+
+# psycopg_pool.ConnectionPool arguments: connections kept open, the most
+# opened at once, and seconds a request waits for a free one
+POSTGRES_POOL = {
+  'min_size': 2,
+  'max_size': 10,
+  'timeout': 10,
+}
+
+
+def postgresql_database(name, user, password, host, port=5432, pool=None):
+  """The DATABASES entry for a PostgreSQL database reached through a connection pool"""
+  return {
+    'ENGINE': 'django.db.backends.postgresql',
+    'NAME': name,
+    'USER': user,
+    'PASSWORD': password,
+    'HOST': host,
+    'PORT': port,
+    # Pooled connections must not also be persistent
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'pool': {**POSTGRES_POOL, **(pool or {})}},
+  }
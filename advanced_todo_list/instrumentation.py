@@ -0,0 +1,256 @@
+"""Per-request SQL, template and latency metrics for every view.
+
+``request_metrics`` times each request and the SQL queries and template
+renders it runs, then reports them three ways: a ``Server-Timing`` header,
+one JSON line on the ``advanced_todo_list.requests`` logger, and latency
+histograms per view kept in process memory for the staff-only
+``request_metrics_view`` page.
+
+Queries are timed by an execute wrapper installed on every database
+connection and templates by the template backend below. Both read the
+current request's counters from a context variable, which asgiref copies
+into the threads that run sync code, so async views are covered too.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.shortcuts import redirect, render
+from django.template.backends import django as django_backend
+from django.utils.decorators import sync_and_async_middleware
+from django.views.decorators.http import require_http_methods
+
+logger = logging.getLogger('advanced_todo_list.requests')
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+UNRESOLVED_VIEW = '(unresolved)'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+  __slots__ = ('queries', 'sql_ns', 'template_ns', 'rendering')
+
+  def __init__(self):
+    self.queries = 0
+    self.sql_ns = 0
+    self.template_ns = 0
+    self.rendering = False
+
+
+def time_query(execute, sql, params, many, context):
+  """Execute wrapper that adds each query and its duration to the current request"""
+  metrics = _current.get()
+  if metrics is None:
+    return execute(sql, params, many, context)
+  started = time.perf_counter_ns()
+  try:
+    return execute(sql, params, many, context)
+  finally:
+    metrics.sql_ns += time.perf_counter_ns() - started
+    metrics.queries += 1
+
+
+def install_query_timer(connection, **kwargs):
+  if time_query not in connection.execute_wrappers:
+    connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class Template(django_backend.Template):
+  def render(self, context=None, request=None):
+    metrics = _current.get()
+    # Only the outermost render is timed, so nested renders are not counted twice
+    if metrics is None or metrics.rendering:
+      return super().render(context, request)
+    metrics.rendering = True
+    started = time.perf_counter_ns()
+    try:
+      return super().render(context, request)
+    finally:
+      metrics.template_ns += time.perf_counter_ns() - started
+      metrics.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+  """The Django template backend, timing every render for the current request.
+
+  Django only sends the template_rendered signal while testing, so renders
+  are timed here instead.
+  """
+  def from_string(self, template_code):
+    return Template(self.engine.from_string(template_code), self)
+
+  def get_template(self, template_name):
+    try:
+      return Template(self.engine.get_template(template_name), self)
+    except django_backend.TemplateDoesNotExist as exc:
+      django_backend.reraise(exc, self)
+
+
+class ViewStats:
+  __slots__ = ('requests', 'buckets', 'total_ms', 'sql_ms', 'template_ms', 'queries', 'max_queries', 'max_ms')
+
+  def __init__(self):
+    self.requests = 0
+    self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+    self.total_ms = 0.0
+    self.sql_ms = 0.0
+    self.template_ms = 0.0
+    self.queries = 0
+    self.max_queries = 0
+    self.max_ms = 0.0
+
+  def add(self, total_ms, sql_ms, template_ms, queries):
+    self.requests += 1
+    self.buckets[bisect_left(LATENCY_BUCKETS, total_ms)] += 1
+    self.total_ms += total_ms
+    self.sql_ms += sql_ms
+    self.template_ms += template_ms
+    self.queries += queries
+    self.max_queries = max(self.max_queries, queries)
+    self.max_ms = max(self.max_ms, total_ms)
+
+  def percentile(self, fraction):
+    """The upper bound of the bucket holding the given fraction of requests"""
+    seen = 0
+    for bound, count in zip((*LATENCY_BUCKETS, None), self.buckets):
+      seen += count
+      if seen >= fraction * self.requests:
+        return bound
+    return None
+
+
+class Histograms:
+  """Latency histograms and SQL and template totals per view, for this process"""
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.views = {}
+
+  def add(self, view, *values):
+    with self.lock:
+      stats = self.views.get(view)
+      if stats is None:
+        stats = self.views[view] = ViewStats()
+      stats.add(*values)
+
+  def snapshot(self):
+    with self.lock:
+      views = {}
+      for view, stats in self.views.items():
+        copy = views[view] = ViewStats()
+        for name in ViewStats.__slots__:
+          value = getattr(stats, name)
+          setattr(copy, name, list(value) if isinstance(value, list) else value)
+      return views
+
+  def clear(self):
+    with self.lock:
+      self.views.clear()
+
+
+histograms = Histograms()
+
+
+def _report(request, response, metrics, started):
+  total_ms = (time.perf_counter_ns() - started) / 1e6
+  sql_ms = metrics.sql_ns / 1e6
+  template_ms = metrics.template_ns / 1e6
+  match = request.resolver_match
+  view = match.view_name if match else UNRESOLVED_VIEW
+  histograms.add(view, total_ms, sql_ms, template_ms, metrics.queries)
+
+  if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+    response['Server-Timing'] = (
+      f'sql;dur={sql_ms:.1f};desc="{metrics.queries} queries", '
+      f'tpl;dur={template_ms:.1f}, total;dur={total_ms:.1f}'
+    )
+  if logger.isEnabledFor(logging.INFO):
+    logger.info(json.dumps({
+      'method': request.method,
+      'path': request.path,
+      'view': view,
+      'status': response.status_code,
+      'total_ms': round(total_ms, 2),
+      'sql_queries': metrics.queries,
+      'sql_ms': round(sql_ms, 2),
+      'template_ms': round(template_ms, 2),
+    }))
+
+
+@sync_and_async_middleware
+def request_metrics(get_response):
+  """Record query count, SQL time, template time and latency for each request.
+
+  Put it first in MIDDLEWARE so the latency includes the other middleware.
+  A streamed response is timed until its first byte is ready, not until it
+  has been sent.
+  """
+  for connection in connections.all(initialized_only=True):
+    install_query_timer(connection)
+
+  if iscoroutinefunction(get_response):
+    async def middleware(request):
+      metrics = RequestMetrics()
+      token = _current.set(metrics)
+      started = time.perf_counter_ns()
+      try:
+        response = await get_response(request)
+      finally:
+        _current.reset(token)
+      _report(request, response, metrics, started)
+      return response
+  else:
+    def middleware(request):
+      metrics = RequestMetrics()
+      token = _current.set(metrics)
+      started = time.perf_counter_ns()
+      try:
+        response = get_response(request)
+      finally:
+        _current.reset(token)
+      _report(request, response, metrics, started)
+      return response
+  return middleware
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def request_metrics_view(request):
+  """Latency histograms of every view since this process started, or was reset"""
+  if request.method == 'POST':
+    histograms.clear()
+    return redirect('request_metrics')
+
+  rows = []
+  for view, stats in sorted(histograms.snapshot().items()):
+    peak = max(stats.buckets) or 1
+    rows.append({
+      'view': view,
+      'requests': stats.requests,
+      'p50': stats.percentile(0.5),
+      'p95': stats.percentile(0.95),
+      'max_ms': stats.max_ms,
+      'mean_ms': stats.total_ms / stats.requests,
+      'sql_ms': stats.sql_ms / stats.requests,
+      'template_ms': stats.template_ms / stats.requests,
+      'queries': stats.queries / stats.requests,
+      'max_queries': stats.max_queries,
+      'bars': [(count, round(100 * count / peak)) for count in stats.buckets],
+    })
+  return render(request, 'instrumentation/request_metrics.html', {
+    'rows': rows,
+    'buckets': [f'≤{bound}' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}'],
+  })
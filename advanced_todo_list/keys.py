@@ -0,0 +1,44 @@
+"""Read the project's secrets and deployment keys.
+
+Each key comes from the environment variable of the same name when it is
+set, e.g. SECRETKEY=... or DATABASE_ENGINE=postgresql. Otherwise it comes
+from keys.json next to manage.py, which is read once and only when an
+environment variable is missing. The file is optional when the environment
+provides every required key.
+"""
+import json
+import os
+from functools import cache
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
+KEYS_FILE = Path(__file__).resolve().parent.parent / 'keys.json'
+
+MISSING = object()
+
+
+@cache
+def file_keys(path=KEYS_FILE):
+  """The keys in keys.json, or none when there is no such file"""
+  try:
+    with open(path) as keys_file:
+      return json.load(keys_file)
+  except FileNotFoundError:
+    return {}
+
+
+def get(name, default=MISSING):
+  """A key's value. Raise ImproperlyConfigured if it is missing and has no default"""
+  if name in os.environ:
+    return os.environ[name]
+  try:
+    return file_keys()[name]
+  except KeyError:
+    if default is MISSING:
+      raise ImproperlyConfigured(f'Set the {name} environment variable or add it to keys.json')
+    return default
+
+
+def has(name):
+  return name in os.environ or name in file_keys()
@@ -0,0 +1,112 @@
+"""Serve the reads of read-only pages from a replica database.
+
+``ReplicaRoutingMiddleware`` marks GET and HEAD requests to the views in
+REPLICA_VIEWS. While one of them runs, ``ReplicaRouter`` sends its reads of
+todo models to the ``replica`` alias. Every write, and every read after a
+write in the same request, goes to the primary.
+
+A replica lags behind the primary. So once a client has written anything,
+a cookie pins its reads to the primary for REPLICA_PIN_SECONDS, and it sees
+its own changes on the next page. Sessions and users always come from the
+primary: login_required loads the user lazily inside the view, and a user
+who just registered must not be missing from the replica.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from advanced_todo_list.database import REPLICA
+
+REPLICA_VIEWS = frozenset({
+  'todos:index',
+  'todos:detail',
+  'todos:group_detail',
+  'todos:groups_list',
+  'todos:timer_status',
+  'todos:atimer_status',
+})
+
+# Apps whose models the read-only views may read from the replica
+REPLICA_APPS = frozenset({'todos'})
+
+PIN_COOKIE = 'primary_pin'
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_current = ContextVar('replica_routing', default=None)
+
+
+class Routing:
+  __slots__ = ('pinned', 'use_replica', 'wrote')
+
+  def __init__(self, pinned):
+    self.pinned = pinned
+    self.use_replica = False
+    self.wrote = False
+
+
+class ReplicaRouter:
+  def db_for_read(self, model, **hints):
+    routing = _current.get()
+    if (routing is not None and routing.use_replica and not routing.wrote
+        and model._meta.app_label in REPLICA_APPS):
+      return REPLICA
+    return DEFAULT_DB_ALIAS
+
+  def db_for_write(self, model, **hints):
+    routing = _current.get()
+    if routing is not None:
+      routing.wrote = True
+    return DEFAULT_DB_ALIAS
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # The replica holds the same rows as the primary
+    return True
+
+
+class ReplicaRoutingMiddleware:
+  """Decide per request whether reads may use the replica, and pin writers to the primary"""
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    if iscoroutinefunction(get_response):
+      markcoroutinefunction(self)
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+    routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+    token = _current.set(routing)
+    try:
+      response = self.get_response(request)
+    finally:
+      _current.reset(token)
+    return self.pin(request, response, routing)
+
+  async def __acall__(self, request):
+    routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+    token = _current.set(routing)
+    try:
+      response = await self.get_response(request)
+    finally:
+      _current.reset(token)
+    return self.pin(request, response, routing)
+
+  def process_view(self, request, view_func, view_args, view_kwargs):
+    # Called once the URL is resolved, just before the view runs
+    routing = _current.get()
+    if (routing is not None and not routing.pinned and request.method in SAFE_METHODS
+        and request.resolver_match.view_name in REPLICA_VIEWS):
+      routing.use_replica = True
+
+  def pin(self, request, response, routing):
+    if routing.wrote or request.method not in SAFE_METHODS:
+      response.set_cookie(
+        PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+        secure=request.is_secure(),
+      )
+    return response
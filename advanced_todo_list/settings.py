@@ -1,32 +1,24 @@
 from pathlib import Path
 import os
 
-import json
 from django.core.exceptions import ImproperlyConfigured
 
+from advanced_todo_list import keys
+from advanced_todo_list.database import POSTGRES_POOL, REPLICA, postgresql_database, sqlite_database
+
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-KEYSDIR = str(BASE_DIR)+"/keys.json"
-
-
-with open(KEYSDIR) as k:
-  project_keys: dict = json.loads(k.read())
-
-def get_key(setting,project_keys=project_keys) -> str:
-  try:
-    return project_keys[setting]
-  except KeyError:
-    error_message: str = "Set the {} env var".format(setting)
-    raise ImproperlyConfigured(error_message)
+# Every key below is read from the environment variable of the same name,
+# or else from keys.json; see advanced_todo_list/keys.py.
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = get_key("SECRETKEY")
+SECRET_KEY = keys.get("SECRETKEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = get_key("ENVIRONMENT") == "development" and get_key("ENVIRONMENT") != "production"
+DEBUG = keys.get("ENVIRONMENT", "production") == "development"
 
 ALLOWED_HOSTS = ['*','thedivloop.pythonanywhere.com']
 
@@ -46,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its latency covers the rest of the middleware too
+    'advanced_todo_list.instrumentation.request_metrics',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,12 +51,34 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'advanced_todo_list.urls'
 
+# Templates
+# The "production" profile, the default, compiles each template once and
+# keeps it in memory for the life of the process; runserver still reloads
+# them when a file changes. "TEMPLATE_PROFILE": "development" in keys.json
+# reads and compiles every template on each render instead.
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+TEMPLATE_PROFILES = {
+    'development': TEMPLATE_LOADERS,
+    'production': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
+}
+
+TEMPLATE_PROFILE = keys.get('TEMPLATE_PROFILE', 'production')
+
+if TEMPLATE_PROFILE not in TEMPLATE_PROFILES:
+  raise ImproperlyConfigured('TEMPLATE_PROFILE must be one of {}'.format(', '.join(TEMPLATE_PROFILES)))
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django backend, timing each render for the request metrics
+        'BACKEND': 'advanced_todo_list.instrumentation.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_PROFILES[TEMPLATE_PROFILE],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -79,12 +95,47 @@ WSGI_APPLICATION = 'advanced_todo_list.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# "DATABASE_PROFILE": "production" in keys.json turns on WAL, a busy
+# timeout, IMMEDIATE transactions, larger caches and persistent
+# connections; see advanced_todo_list/database.py.
+# "DATABASE_ENGINE": "postgresql" uses PostgreSQL through a psycopg
+# connection pool instead, from the POSTGRES_NAME, POSTGRES_USER,
+# POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT and POSTGRES_POOL_MAX_SIZE
+# keys. POSTGRES_REPLICA_HOST adds a read replica; with SQLite,
+# SQLITE_REPLICA_NAME names a second file to stand in for one. The pool
+# needs psycopg[pool]: pip install -r requirements-postgresql.txt
+
+DATABASE_PROFILE = keys.get('DATABASE_PROFILE', 'development')
+
+DATABASE_ENGINE = keys.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+  def postgresql(host):
+    return postgresql_database(
+        keys.get('POSTGRES_NAME'), keys.get('POSTGRES_USER'), keys.get('POSTGRES_PASSWORD'), host,
+        keys.get('POSTGRES_PORT', 5432),
+        pool={'max_size': int(keys.get('POSTGRES_POOL_MAX_SIZE', POSTGRES_POOL['max_size']))},
+    )
+
+  DATABASES = {'default': postgresql(keys.get('POSTGRES_HOST'))}
+  if keys.has('POSTGRES_REPLICA_HOST'):
+    # Tests read the primary's test database through the replica alias
+    DATABASES[REPLICA] = {**postgresql(keys.get('POSTGRES_REPLICA_HOST')), 'TEST': {'MIRROR': 'default'}}
+elif DATABASE_ENGINE == 'sqlite':
+  DATABASES = {'default': sqlite_database(BASE_DIR / 'db.sqlite3', DATABASE_PROFILE)}
+  if keys.has('SQLITE_REPLICA_NAME'):
+    DATABASES[REPLICA] = sqlite_database(BASE_DIR / keys.get('SQLITE_REPLICA_NAME'), DATABASE_PROFILE)
+else:
+  raise ImproperlyConfigured('DATABASE_ENGINE must be sqlite or postgresql')
+
+# With a replica, the read-only pages read from it; see advanced_todo_list/routers.py.
+# A client that wrote reads from the primary for this many seconds.
+
+REPLICA_PIN_SECONDS = 5
+
+if REPLICA in DATABASES:
+  DATABASE_ROUTERS = ['advanced_todo_list.routers.ReplicaRouter']
+  MIDDLEWARE.insert(1, 'advanced_todo_list.routers.ReplicaRoutingMiddleware')
 
 
 # Password validation
@@ -134,4 +185,82 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches
+# Rendered todo cards and list pages live in their own cache. It is an
+# in-process local-memory cache unless keys.json names another backend, e.g.
+# "FRAGMENT_CACHE_BACKEND": "django.core.cache.backends.redis.RedisCache"
+# with "FRAGMENT_CACHE_LOCATION": "redis://127.0.0.1:6379". Users' running
+# timers are only cached there when it is shared like that.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'todo_fragments': {
+        'BACKEND': keys.get('FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': keys.get('FRAGMENT_CACHE_LOCATION', 'todo-fragments'),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 10000} if not keys.has('FRAGMENT_CACHE_BACKEND') else {},
+    },
+    'sessions': {
+        'BACKEND': keys.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': keys.get('SESSION_CACHE_LOCATION', 'sessions'),
+    },
+}
+
+TODO_FRAGMENT_CACHE = 'todo_fragments'
+
+# Sessions and logged-in users
+# "SESSION_MODE" in keys.json picks where sessions are kept: "db" (the
+# default), "cached_db" (the database, read through the sessions cache) or
+# "signed_cookies" (in the signed cookie itself, so no query at all, but a
+# copied cookie stays valid until it expires). The user of each session is
+# kept in the same cache for AUTH_USER_CACHE_TIMEOUT seconds. Both caches
+# are only used when the sessions cache is shared between processes, e.g.
+# "SESSION_CACHE_BACKEND": "django.core.cache.backends.redis.RedisCache"
+# with "SESSION_CACHE_LOCATION": "redis://127.0.0.1:6379/1".
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+try:
+  SESSION_ENGINE = SESSION_ENGINES[keys.get('SESSION_MODE', 'db')]
+except KeyError:
+  raise ImproperlyConfigured('SESSION_MODE must be one of {}'.format(', '.join(SESSION_ENGINES)))
+
+SESSION_CACHE_ALIAS = 'sessions'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
+AUTH_USER_CACHE = 'sessions'
+
+AUTH_USER_CACHE_TIMEOUT = 60
+
 LOGIN_URL = '/login/'
+
+# Request metrics
+# Every response gets a Server-Timing header with its SQL, template and total
+# time. Set "REQUEST_LOG_LEVEL": "INFO" in keys.json to also log one JSON
+# line per request on the advanced_todo_list.requests logger.
+
+REQUEST_METRICS_SERVER_TIMING = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'advanced_todo_list.requests': {
+            'handlers': ['console'],
+            'level': keys.get('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,20 @@
+"""The app's settings with a second SQLite file standing in for a read replica.
+
+Nothing copies rows between the two files, so a page read from the
+replica shows what was written there and not what went to the primary,
+which makes the routing visible. Only the replica tests declare the second
+database, so run them on their own:
+
+  python manage.py migrate --run-syncdb --settings=advanced_todo_list.settings_replica
+  python manage.py migrate --run-syncdb --database=replica --settings=advanced_todo_list.settings_replica
+  python manage.py test --settings=advanced_todo_list.settings_replica todos.tests.ReplicaRoutingTests
+"""
+from advanced_todo_list.settings import *  # noqa: F401,F403
+from advanced_todo_list.settings import BASE_DIR, DATABASE_PROFILE, DATABASES, MIDDLEWARE
+from advanced_todo_list.database import sqlite_database
+from advanced_todo_list.routers import REPLICA
+
+if REPLICA not in DATABASES:
+  DATABASES[REPLICA] = sqlite_database(BASE_DIR / 'db-replica.sqlite3', DATABASE_PROFILE)
+  DATABASE_ROUTERS = ['advanced_todo_list.routers.ReplicaRouter']
+  MIDDLEWARE.insert(1, 'advanced_todo_list.routers.ReplicaRoutingMiddleware')
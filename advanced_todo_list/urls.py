@@ -17,10 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .instrumentation import request_metrics_view
+
 urlpatterns = [
     path('', include(('public_frontend.urls','public_frontend'), namespace='public_frontend')),
     path('', include('users.urls')),
     path('todos/', include('todos.urls')),
     # path('todos/', include('todos.urls', namespace='todos')),
+    path('admin/request-metrics/', request_metrics_view, name='request_metrics'),
     path('admin/', admin.site.urls),
 ]
@@ -0,0 +1,92 @@
+"""Count the queries the timer polling endpoints spend on sessions and users.
+
+Logs one user in under each session mode, with and without the shared user
+cache, polls the timer endpoints and reports the queries per request and
+how many of them only load the session or the user:
+
+  python benchmarks/auth_queries.py
+  python benchmarks/auth_queries.py --requests 500
+
+The sessions cache is a file cache in a temporary directory for the run,
+standing in for the shared Redis or Memcached a deployment would use.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODES = (
+  # (label, session engine, sessions cache shared)
+  ('db', 'django.contrib.sessions.backends.db', False),
+  ('db + user cache', 'django.contrib.sessions.backends.db', True),
+  ('cached_db + user cache', 'django.contrib.sessions.backends.cached_db', True),
+  ('signed_cookies + user cache', 'django.contrib.sessions.backends.signed_cookies', True),
+)
+
+
+def setup_django():
+  sys.path.insert(0, str(BASE_DIR))
+  os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_todo_list.settings')
+  import django
+  django.setup()
+
+
+def poll(client, urls, requests):
+  from django.db import connection
+  from django.test.utils import CaptureQueriesContext
+
+  queries = auth_queries = 0
+  started = time.perf_counter()
+  for number in range(requests):
+    with CaptureQueriesContext(connection) as captured:
+      client.get(urls[number % len(urls)])
+    queries += len(captured)
+    auth_queries += sum('"django_session"' in query['sql'] or '"auth_user"' in query['sql'] for query in captured)
+  elapsed = time.perf_counter() - started
+  return queries / requests, auth_queries / requests, elapsed / requests * 1000
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--requests', type=int, default=200)
+  args = parser.parse_args()
+
+  setup_django()
+  from django.conf import settings
+  from django.contrib.auth.models import User
+  from django.core.cache import caches
+  from django.db import connection
+  from django.test import Client, override_settings
+  from django.urls import reverse
+  from todos.models import Todo
+
+  old_name = connection.creation.create_test_db(verbosity=0)
+  try:
+    user = User.objects.create_user(username='auth-benchmark', password='auth-benchmark-pass')
+    todo = Todo.objects.create(user=user, title='Polled')
+    urls = [reverse('todos:check_active_timer'), reverse('todos:timer_status', args=[todo.pk])]
+
+    print(f'{"mode":>28} {"queries":>8} {"auth":>6} {"ms/req":>7}')
+    with tempfile.TemporaryDirectory() as cache_dir:
+      shared = {**settings.CACHES, 'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+      }}
+      for label, engine, cached in MODES:
+        with override_settings(SESSION_ENGINE=engine, CACHES=shared if cached else settings.CACHES):
+          caches['sessions'].clear()
+          client = Client()
+          client.login(username='auth-benchmark', password='auth-benchmark-pass')
+          # The first request fills the caches
+          client.get(urls[0])
+          queries, auth_queries, ms = poll(client, urls, args.requests)
+          print(f'{label:>28} {queries:>8.1f} {auth_queries:>6.1f} {ms:>7.2f}')
+  finally:
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+  main()
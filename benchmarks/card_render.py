@@ -0,0 +1,109 @@
+"""Compare rendering todo cards with and without the fragment cache.
+
+Builds unsaved todos in memory and times three ways of rendering them:
+the plain template loop the index page used before, render_cards() with an
+empty cache and render_cards() once every card is cached:
+
+  python benchmarks/card_render.py
+  python benchmarks/card_render.py --sizes 1000 10000 50000 --repeat 3
+
+The fragment cache is replaced by a large local-memory cache for the run,
+so the numbers do not depend on the configured backend.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+  sys.path.insert(0, str(BASE_DIR))
+  os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_todo_list.settings')
+  import django
+  django.setup()
+
+
+def make_todos(count):
+  from django.utils import timezone
+  from todos.models import Todo
+
+  rng = random.Random(count)
+  now = timezone.now()
+  todos = []
+  for pk in range(1, count + 1):
+    duration = rng.choice([None, 30, 60, 120])
+    time_spent = rng.randint(0, duration) if duration else None
+    todos.append(Todo(
+      pk=pk,
+      title=f'Benchmark task {pk}',
+      description=rng.choice(['', 'Some notes about this task & what is left to do.']),
+      priority=rng.choice(['Low', 'Medium', 'High']),
+      status=rng.choice(['Pending', 'In Progress', 'Completed']),
+      due_date=rng.choice([None, (now + timedelta(days=rng.randint(-10, 10))).date()]),
+      duration=duration,
+      time_spent=time_spent,
+      time_completion=int(time_spent * 100 / duration) if duration else None,
+      created_at=now - timedelta(minutes=pk),
+      updated_at=now - timedelta(seconds=pk),
+    ))
+  return todos
+
+
+def timed(function, repeat):
+  best = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+  parser.add_argument('--repeat', type=int, default=3, help='Report the best of this many runs.')
+  args = parser.parse_args()
+
+  setup_django()
+  from django.conf import settings
+  from django.template import engines
+  from django.test.utils import override_settings
+  from django.utils import timezone
+  from todos.fragments import fragment_cache, render_cards
+
+  loop = engines['django'].from_string(
+    "{% for todo in todos %}{% include 'todos/todo_card.html' %}{% endfor %}"
+  )
+  today = timezone.now().date()
+  caches = {
+    **settings.CACHES,
+    settings.TODO_FRAGMENT_CACHE: {
+      'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+      'LOCATION': 'card-render-benchmark',
+      'OPTIONS': {'MAX_ENTRIES': max(args.sizes) * 2},
+    },
+  }
+
+  print(f'{"cards":>7} {"template loop":>14} {"cold cache":>11} {"warm cache":>11} {"speedup":>8}')
+  with override_settings(CACHES=caches):
+    for size in args.sizes:
+      todos = make_todos(size)
+
+      def cold():
+        fragment_cache().clear()
+        render_cards(todos, today)
+
+      plain = timed(lambda: loop.render({'todos': todos, 'today': today}), args.repeat)
+      cold_time = timed(cold, args.repeat)
+      warm = timed(lambda: render_cards(todos, today), args.repeat)
+      print(f'{size:>7} {plain:>13.3f}s {cold_time:>10.3f}s {warm:>10.3f}s {plain / warm:>7.1f}x')
+
+
+if __name__ == '__main__':
+  main()
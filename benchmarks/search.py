@@ -0,0 +1,125 @@
+"""Compare todo search through the FTS5 index with an icontains scan.
+
+Fills a throwaway test database with one user's todos, and another user's
+todos alongside them, and times the same searches three ways: the icontains
+filter the index page used before, the index-backed filter it uses now, and
+the ranked search endpoint with snippets:
+
+  python benchmarks/search.py
+  python benchmarks/search.py --rows 100000 --other-rows 1000000 --repeat 5
+
+Every index query is narrowed to the user's own rows, so the other user's
+todos only cost the index pages read to skip them. Matching the owner reads
+that user's entry in the index, though, which adds a few milliseconds to a
+rare word's search when the user has a hundred thousand todos.
+
+Only SQLite has the index, so run it against the default settings.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+COMMON_WORDS = (
+  'report budget meeting release deploy review invoice dentist garden groceries '
+  'backup server laptop migrate database design sketch write draft email call '
+  'plan trip flight hotel renew passport insurance taxes refactor tests docs'
+).split()
+SYLLABLES = 'ka lo mi ne ru sa ti vo be da fe gi po zu'.split()
+
+# Word frequencies follow Zipf's law, as in real text: a few common words
+# and a long tail of rare ones
+WORDS = COMMON_WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+WEIGHTS = [1 / rank for rank in range(1, len(WORDS) + 1)]
+
+# The most common word, a middling one, a rare one, a prefix, two words and
+# a word that matches nothing
+QUERIES = ('report', 'passport', 'gizuvo', 'migr', 'budget review', 'zebra')
+
+
+def setup_django():
+  sys.path.insert(0, str(BASE_DIR))
+  os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_todo_list.settings')
+  import django
+  django.setup()
+
+
+def fill(user, rows):
+  from todos.models import Todo
+  from todos.search import rebuild_search_index
+
+  rng = random.Random(rows)
+  batch = []
+  for number in range(rows):
+    title = ' '.join(rng.choices(WORDS, WEIGHTS, k=rng.randint(2, 5))).capitalize()
+    description = ' '.join(rng.choices(WORDS, WEIGHTS, k=rng.randint(0, 20)))
+    batch.append(Todo(user=user, title=f'{title} {number}', description=description))
+    if len(batch) == 5000:
+      Todo.objects.bulk_create(batch)
+      batch = []
+  Todo.objects.bulk_create(batch)
+  rebuild_search_index()
+
+
+def timed(function, repeat):
+  best = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  return best * 1000
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--rows', type=int, default=100000)
+  parser.add_argument('--other-rows', type=int, help="The other user's todos; a tenth of --rows by default.")
+  parser.add_argument('--repeat', type=int, default=5, help='Report the best of this many runs.')
+  args = parser.parse_args()
+  if args.other_rows is None:
+    args.other_rows = args.rows // 10
+
+  setup_django()
+  from django.contrib.auth.models import User
+  from django.db import connection
+  from django.db.models import Q
+  from todos.listing import PAGE_SIZE
+  from todos.models import Todo
+  from todos.search import search_filter, search_todos
+
+  if connection.vendor != 'sqlite':
+    sys.exit('The search index is only built on SQLite.')
+
+  old_name = connection.creation.create_test_db(verbosity=0)
+  try:
+    user = User.objects.create_user(username='search-benchmark')
+    # Another user's todos share the index, as they would in production
+    other = User.objects.create_user(username='search-benchmark-other')
+    started = time.perf_counter()
+    fill(user, args.rows)
+    fill(other, args.other_rows)
+    print(f'Inserted and indexed {args.rows + args.other_rows} todos in {time.perf_counter() - started:.1f}s\n')
+
+    todos = Todo.objects.filter(user=user).order_by('-created_at', '-id')
+    print(f'{"query":>15} {"matches":>8} {"icontains":>10} {"index":>8} {"ranked":>8} {"speedup":>8}')
+    for query in QUERIES:
+      naive = todos
+      for word in query.split():
+        naive = naive.filter(Q(title__icontains=word) | Q(description__icontains=word))
+      matches = search_filter(todos, user, query).count()
+      scan = timed(lambda: list(naive[:PAGE_SIZE]), args.repeat)
+      # The index is read when the filter is applied, so that is timed too
+      index = timed(lambda: list(search_filter(todos, user, query)[:PAGE_SIZE]), args.repeat)
+      ranked = timed(lambda: search_todos(user, query), args.repeat)
+      print(f'{query:>15} {matches:>8} {scan:>8.1f}ms {index:>6.1f}ms {ranked:>6.1f}ms {scan / index:>7.1f}x')
+  finally:
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+  main()
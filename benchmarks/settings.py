@@ -0,0 +1,17 @@
+"""Settings for the benchmark suite: the app's settings on a separate database.
+
+The database file is named by BENCHMARK_DATABASE, so the suite and the
+server it starts share the seeded data without touching db.sqlite3, and
+BENCHMARK_DATABASE_PROFILE can override the configured database profile.
+"""
+import os
+import tempfile
+
+from advanced_todo_list.settings import *  # noqa: F401,F403
+from advanced_todo_list.database import sqlite_database
+from advanced_todo_list.settings import DATABASE_PROFILE, DATABASES
+
+DATABASES['default'] = sqlite_database(
+  os.environ.get('BENCHMARK_DATABASE', os.path.join(tempfile.gettempdir(), 'atlas-benchmark.sqlite3')),
+  os.environ.get('BENCHMARK_DATABASE_PROFILE', DATABASE_PROFILE),
+)
@@ -0,0 +1,411 @@
+"""Benchmark the app's main routes and compare them with a stored baseline.
+
+Seeds a fresh benchmark database with users, groups and todos, then drives
+the real URL routes through the Django test client and, with --http,
+through uvicorn with concurrent keep-alive clients. For every route it
+records throughput, p50/p95/p99 latency and the SQL query count (read
+from the Server-Timing header), writes them to JSON and compares them
+with benchmarks/baseline.json:
+
+  python benchmarks/suite.py
+  python benchmarks/suite.py --http --concurrency 20
+  python benchmarks/suite.py --users 200 --todos-per-user 500 --output results.json
+  python benchmarks/suite.py --update-baseline
+
+A route regresses when it runs more queries than in the baseline, when
+its requests fail and did not before, or when its p95 latency or
+throughput is worse by more than --tolerance. Any regression
+is printed and the exit status is 1. Timings are only compared when the
+data volumes match the baseline's; regenerate the baseline on the machine
+that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+USERNAME_PREFIX = 'bench-'
+SEARCH_WORD = 'report'
+WORDS = (
+  'report budget meeting release deploy review invoice dentist garden groceries '
+  'backup server laptop migrate database design sketch write draft email call '
+  'plan trip flight hotel renew passport insurance taxes refactor tests docs'
+).split()
+
+# name: (method, url name, query string, takes a todo id, takes a group id)
+ROUTES = {
+  'index': ('GET', 'todos:index', '', False, False),
+  'index_filtered': ('GET', 'todos:index', 'status=pending&sort=priority', False, False),
+  'index_search': ('GET', 'todos:index', f'q={SEARCH_WORD}', False, False),
+  'detail': ('GET', 'todos:detail', '', True, False),
+  'groups_list': ('GET', 'todos:groups_list', '', False, False),
+  'group_detail': ('GET', 'todos:group_detail', '', False, True),
+  'timer_status': ('GET', 'todos:timer_status', '', True, False),
+  'check_active_timer': ('GET', 'todos:check_active_timer', '', False, False),
+  'timer_start': ('POST', 'todos:start_timer', '', True, False),
+  'search': ('GET', 'todos:search', f'q={SEARCH_WORD}', False, False),
+  'sync': ('GET', 'todos:sync', 'cursor=0', False, False),
+}
+
+
+def setup_django(database):
+  sys.path.insert(0, str(BASE_DIR))
+  os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+  # The server started for --http reads the same database
+  os.environ['BENCHMARK_DATABASE'] = database
+  import django
+  django.setup()
+
+
+def create_database(database):
+  from django.core.management import call_command
+
+  for suffix in ('', '-wal', '-shm'):
+    Path(database + suffix).unlink(missing_ok=True)
+  call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def seed(users, groups_per_user, todos_per_user, seed_value):
+  """Create the benchmark users, groups and todos with bulk inserts"""
+  from django.contrib.auth.hashers import make_password
+  from django.contrib.auth.models import User
+  from django.db import transaction
+  from django.utils import timezone
+  from todos.models import TaskGroup, Todo
+  from todos.search import rebuild_search_index
+
+  rng = random.Random(seed_value)
+  now = timezone.now()
+  today = date.today()
+  password = make_password(None)
+  with transaction.atomic():
+    User.objects.bulk_create([User(username=f'{USERNAME_PREFIX}{number}', password=password) for number in range(users)])
+    user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id').values_list('id', flat=True))
+    TaskGroup.objects.bulk_create([
+      TaskGroup(user_id=user_id, name=f'Group {number}') for user_id in user_ids for number in range(groups_per_user)
+    ])
+    groups = {}
+    for group_id, user_id in TaskGroup.objects.values_list('id', 'user_id').order_by('id'):
+      groups.setdefault(user_id, []).append(group_id)
+
+    batch = []
+    for user_id in user_ids:
+      for number in range(todos_per_user):
+        duration = rng.choice([None, 30, 60, 120])
+        time_spent = rng.randint(0, duration) if duration else None
+        batch.append(Todo(
+          user_id=user_id,
+          group_id=rng.choice(groups.get(user_id, []) + [None]),
+          title=' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize(),
+          description=' '.join(rng.choices(WORDS, k=rng.randint(0, 12))),
+          priority=rng.choice(['Low', 'Medium', 'High']),
+          status=rng.choice(['Pending', 'In Progress', 'Completed']),
+          due_date=rng.choice([None, today + timedelta(days=rng.randint(-30, 30))]),
+          duration=duration,
+          time_spent=time_spent,
+          time_completion=int(time_spent * 100 / duration) if duration else None,
+          created_at=now - timedelta(minutes=number),
+          updated_at=now - timedelta(minutes=number),
+        ))
+        if len(batch) >= 5000:
+          Todo.objects.bulk_create(batch)
+          batch = []
+    Todo.objects.bulk_create(batch)
+    rebuild_search_index()
+  return user_ids
+
+
+def fixture(user_id):
+  """The ids a benchmark user's requests point at"""
+  from todos.models import TaskGroup, Todo
+
+  return {
+    'user_id': user_id,
+    'todo_ids': list(Todo.objects.filter(user_id=user_id).order_by('id').values_list('id', flat=True)[:20]),
+    'group_ids': list(TaskGroup.objects.filter(user_id=user_id).order_by('id').values_list('id', flat=True)[:5]),
+  }
+
+
+def route_path(name, data, number):
+  """The path of the number-th request to a route; todo and group ids rotate"""
+  from django.urls import reverse
+
+  _method, url_name, query, takes_todo, takes_group = ROUTES[name]
+  args = []
+  if takes_todo:
+    # Timer starts alternate between two todos, so each one switches timers
+    todo_ids = data['todo_ids'][:2] if name == 'timer_start' else data['todo_ids']
+    args = [todo_ids[number % len(todo_ids)]]
+  if takes_group:
+    args = [data['group_ids'][number % len(data['group_ids'])]]
+  path = reverse(url_name, args=args)
+  return f'{path}?{query}' if query else path
+
+
+def query_count(server_timing):
+  # e.g. sql;dur=1.2;desc="5 queries", tpl;dur=0.4, total;dur=3.1
+  for metric in server_timing.split(','):
+    if metric.strip().startswith('sql;'):
+      return int(metric.split('desc="')[1].split()[0])
+  return None
+
+
+def percentile(values, fraction):
+  if not values:
+    return None
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(elapsed, latencies, queries, errors):
+  return {
+    'requests': len(latencies),
+    'rps': round(len(latencies) / elapsed, 1),
+    'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+    'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+    'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    # The median, so the odd cache miss of a concurrent run does not count
+    'queries': percentile(queries, 0.5),
+    'errors': errors,
+  }
+
+
+def run_client_phase(data, routes, requests):
+  """Time each route through the test client, one request at a time"""
+  from django.contrib.auth.models import User
+  from django.test import Client
+
+  client = Client()
+  client.force_login(User.objects.get(pk=data['user_id']))
+  results = {}
+  for name in routes:
+    method = ROUTES[name][0].lower()
+    # Warm up sessions, caches and the URL resolver
+    for number in range(5):
+      getattr(client, method)(route_path(name, data, number))
+    latencies, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for number in range(requests):
+      path = route_path(name, data, number)
+      request_started = time.perf_counter()
+      response = getattr(client, method)(path)
+      latencies.append(time.perf_counter() - request_started)
+      if response.status_code != 200:
+        errors += 1
+      queries.append(query_count(response.get('Server-Timing', '')))
+    results[name] = summarize(time.perf_counter() - started, latencies, [q for q in queries if q is not None], errors)
+  return results
+
+
+async def _read_response(reader):
+  head = await reader.readuntil(b'\r\n\r\n')
+  lines = head.decode('latin-1').split('\r\n')
+  status = int(lines[0].split()[1])
+  headers = {}
+  for line in lines[1:]:
+    if ':' in line:
+      name, value = line.split(':', 1)
+      headers[name.strip().lower()] = value.strip()
+  if headers.get('transfer-encoding') == 'chunked':
+    while True:
+      size = int((await reader.readline()).strip(), 16)
+      await reader.readexactly(size + 2)
+      if size == 0:
+        break
+  else:
+    await reader.readexactly(int(headers.get('content-length', 0)))
+  return status, headers
+
+
+async def _http_client(port, session, name, remaining, latencies, queries, errors):
+  """Send requests over one keep-alive connection until the shared budget is spent"""
+  method = ROUTES[name][0]
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  try:
+    number = 0
+    while remaining[0] > 0:
+      remaining[0] -= 1
+      number += 1
+      request = (
+        f'{method} {route_path(name, session, number)} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+        f'{session["headers"]}Content-Length: 0\r\n\r\n'
+      )
+      started = time.perf_counter()
+      writer.write(request.encode())
+      status, headers = await _read_response(reader)
+      latencies.append(time.perf_counter() - started)
+      if status != 200:
+        errors.append(status)
+      count = query_count(headers.get('server-timing', ''))
+      if count is not None:
+        queries.append(count)
+      if headers.get('connection', '').lower() == 'close':
+        writer.close()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  finally:
+    writer.close()
+
+
+async def _measure(port, sessions, name, requests):
+  remaining = [requests]
+  latencies, queries, errors = [], [], []
+  started = time.perf_counter()
+  await asyncio.gather(*(
+    _http_client(port, session, name, remaining, latencies, queries, errors) for session in sessions
+  ))
+  return summarize(time.perf_counter() - started, latencies, queries, len(errors))
+
+
+def http_sessions(user_ids, concurrency):
+  """A logged-in session per concurrent client, each for a different user"""
+  from django.conf import settings
+  from django.contrib.auth.models import User
+  from django.middleware.csrf import _get_new_csrf_string
+  from django.test import Client
+
+  sessions = []
+  for user_id in user_ids[:concurrency]:
+    client = Client()
+    client.force_login(User.objects.get(pk=user_id))
+    csrf = _get_new_csrf_string()
+    session = fixture(user_id)
+    session['headers'] = (
+      f'Cookie: {settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+      f'{settings.CSRF_COOKIE_NAME}={csrf}\r\nX-CSRFToken: {csrf}\r\n'
+    )
+    sessions.append(session)
+  return sessions
+
+
+def run_http_phase(user_ids, routes, requests, concurrency, port):
+  """Time each route through uvicorn with concurrent keep-alive clients"""
+  from timer_load import start_server
+
+  sessions = http_sessions(user_ids, concurrency)
+  server = start_server('uvicorn', port)
+  try:
+    results = {}
+    for name in routes:
+      asyncio.run(_measure(port, sessions, name, len(sessions)))
+      results[name] = asyncio.run(_measure(port, sessions, name, requests))
+    return results
+  finally:
+    server.terminate()
+    server.wait()
+
+
+def compare(results, baseline, tolerance):
+  """Regressions of results against the baseline, as printable lines"""
+  same_volumes = results['volumes'] == baseline.get('volumes')
+  regressions = []
+  for phase, routes in results['phases'].items():
+    for name, current in routes.items():
+      previous = baseline.get('phases', {}).get(phase, {}).get(name)
+      if not previous:
+        continue
+      label = f'{phase}/{name}'
+      if current['queries'] is not None and previous['queries'] is not None and current['queries'] > previous['queries']:
+        regressions.append(f'{label}: {current["queries"]} queries, baseline {previous["queries"]}')
+      if current['errors'] and not previous['errors']:
+        regressions.append(f'{label}: {current["errors"]} failed requests, baseline none')
+      if not same_volumes:
+        continue
+      if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+        regressions.append(f'{label}: p95 {current["p95_ms"]}ms, baseline {previous["p95_ms"]}ms')
+      if current['rps'] < previous['rps'] * (1 - tolerance):
+        regressions.append(f'{label}: {current["rps"]} req/s, baseline {previous["rps"]} req/s')
+  return same_volumes, regressions
+
+
+def print_results(results):
+  print(f'{"route":<28} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"errors":>7}')
+  for phase, routes in results['phases'].items():
+    for name, row in routes.items():
+      print(
+        f'{phase + "/" + name:<28} {row["rps"]:>8} {row["p50_ms"]:>8} {row["p95_ms"]:>8} '
+        f'{row["p99_ms"]:>8} {row["queries"] if row["queries"] is not None else "-":>8} {row["errors"]:>7}'
+      )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--users', type=int, default=50)
+  parser.add_argument('--groups-per-user', type=int, default=5)
+  parser.add_argument('--todos-per-user', type=int, default=200)
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--requests', type=int, default=200, help='Requests per route and phase')
+  parser.add_argument('--routes', default=','.join(ROUTES), help=f'Comma separated, from {", ".join(ROUTES)}')
+  parser.add_argument('--http', action='store_true', help='Also load test through uvicorn')
+  parser.add_argument('--concurrency', type=int, default=10)
+  parser.add_argument('--port', type=int, default=8766)
+  parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'atlas-benchmark.sqlite3'))
+  parser.add_argument('--output', help='Write the results to this JSON file')
+  parser.add_argument('--baseline', default=str(BASELINE))
+  parser.add_argument('--tolerance', type=float, default=0.5,
+                      help='Allowed fraction by which p95 latency and throughput may be worse')
+  parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+  args = parser.parse_args()
+
+  routes = [name.strip() for name in args.routes.split(',') if name.strip()]
+  unknown = set(routes) - ROUTES.keys()
+  if unknown:
+    parser.error(f'unknown routes: {", ".join(sorted(unknown))}')
+  if args.http and args.concurrency > args.users:
+    parser.error('--concurrency cannot exceed --users: each client logs in as its own user')
+
+  setup_django(args.database)
+  import django
+
+  create_database(args.database)
+  started = time.perf_counter()
+  user_ids = seed(args.users, args.groups_per_user, args.todos_per_user, args.seed)
+  print(f'Seeded {args.users * args.todos_per_user} todos in {time.perf_counter() - started:.1f}s\n')
+
+  results = {
+    'volumes': {
+      'users': args.users, 'groups_per_user': args.groups_per_user,
+      'todos_per_user': args.todos_per_user, 'seed': args.seed, 'requests': args.requests,
+    },
+    'environment': {
+      'python': platform.python_version(), 'django': django.get_version(), 'machine': platform.machine(),
+    },
+    'phases': {'client': run_client_phase(fixture(user_ids[0]), routes, args.requests)},
+  }
+  if args.http:
+    results['phases']['http'] = run_http_phase(user_ids, routes, args.requests, args.concurrency, args.port)
+  print_results(results)
+
+  if args.output:
+    Path(args.output).write_text(json.dumps(results, indent=2) + '\n')
+  if args.update_baseline:
+    Path(args.baseline).write_text(json.dumps(results, indent=2) + '\n')
+    print(f'\nStored the baseline in {args.baseline}')
+    return
+
+  baseline_path = Path(args.baseline)
+  if not baseline_path.exists():
+    print(f'\nNo baseline at {baseline_path}; run with --update-baseline to store one.')
+    return
+  same_volumes, regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+  if not same_volumes:
+    print('\nThe data volumes differ from the baseline: only query counts and errors were compared.')
+  if regressions:
+    print('\nPERFORMANCE REGRESSIONS:')
+    for line in regressions:
+      print(f'  {line}')
+    sys.exit(1)
+  print('\nNo regressions against the baseline.')
+
+
+if __name__ == '__main__':
+  main()
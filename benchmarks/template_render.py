@@ -0,0 +1,135 @@
+"""Measure what compiling and rendering each todos page costs.
+
+Renders the pages with both template profiles from settings.py:
+"development", which reads and compiles every template on each render,
+and "production", whose cached loader compiles each template once. The
+difference between them is the compile cost. Also prints the size of
+the HTML each page sends:
+
+  python benchmarks/template_render.py
+  python benchmarks/template_render.py --compare HEAD~1 --renders 500
+
+--compare also renders the todos templates as they were at a git
+revision, with the rest of the templates as they are now, so a change to
+a page can be measured before and after.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PAGES = ('todos/index.html', 'todos/detail.html')
+
+
+def setup_django():
+  sys.path.insert(0, str(BASE_DIR))
+  os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'advanced_todo_list.settings')
+  import django
+  django.setup()
+
+
+def page_contexts():
+  """A logged-in user's context for each page, with a page of rendered cards"""
+  from django.contrib.auth.models import User
+  from django.http import HttpRequest
+  from todos.fragments import render_cards
+  from card_render import make_todos
+
+  todos = make_todos(25)
+  request = HttpRequest()
+  request.path = '/todos/'
+  common = {'request': request, 'user': User(pk=1, username='bench'), 'csrf_token': 'x' * 64}
+  return {
+    'todos/index.html': {
+      **common,
+      'cards': render_cards(todos, date.today()),
+      'groups': [],
+      'stats': {'total': 25, 'in_progress': 8, 'completed': 9, 'overdue': 3},
+      'current_path': request.path,
+      'search_query': '',
+      'selected_status': 'all',
+      'selected_priority': 'all',
+      'selected_sort': 'newest',
+    },
+    'todos/detail.html': {**common, 'todo': todos[0]},
+  }
+
+
+def templates_at(revision, directory):
+  """Write the PAGES as they were at a git revision into directory"""
+  for page in PAGES:
+    source = subprocess.run(
+      ['git', 'show', f'{revision}:todos/templates/{page}'],
+      cwd=BASE_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    path = Path(directory, page)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(source)
+
+
+def per_render(engine, page, context, renders, repeat):
+  """Best seconds per get_template() and render() over repeat runs of renders each"""
+  from django.template import Context
+
+  best = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    for _ in range(renders):
+      engine.get_template(page).render(Context(context))
+    elapsed = (time.perf_counter() - started) / renders
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def report(label, dirs, contexts, renders, repeat):
+  from django.conf import settings
+  from django.template import Context
+  from django.template.backends.django import DjangoTemplates
+
+  # Through the backend, which also registers the installed apps' tag libraries
+  engines = {
+    profile: DjangoTemplates({
+      'NAME': profile, 'DIRS': dirs, 'APP_DIRS': False, 'OPTIONS': {'loaders': loaders},
+    }).engine
+    for profile, loaders in settings.TEMPLATE_PROFILES.items()
+  }
+  for page in PAGES:
+    context = contexts[page]
+    html = engines['production'].get_template(page).render(Context(context))
+    uncached = per_render(engines['development'], page, context, renders, repeat)
+    cached = per_render(engines['production'], page, context, renders, repeat)
+    print(
+      f'{label:>10} {page:<20} {(uncached - cached) * 1e6:>8.0f}us {cached * 1e6:>8.0f}us '
+      f'{uncached * 1e6:>9.0f}us {len(html.encode()):>9,}'
+    )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--renders', type=int, default=200, help='Renders per run.')
+  parser.add_argument('--repeat', type=int, default=3, help='Report the best of this many runs.')
+  parser.add_argument('--compare', metavar='REVISION', help='Also render the todos pages as they were at this git revision.')
+  args = parser.parse_args()
+
+  sys.path.insert(0, str(Path(__file__).resolve().parent))
+  setup_django()
+  from django.conf import settings
+
+  contexts = page_contexts()
+  dirs = settings.TEMPLATES[0]['DIRS']
+  print(f'{"templates":>10} {"page":<20} {"compile":>10} {"render":>10} {"uncached":>11} {"HTML bytes":>9}')
+  if args.compare:
+    with tempfile.TemporaryDirectory() as directory:
+      templates_at(args.compare, directory)
+      report(args.compare, [directory, *dirs], contexts, args.renders, args.repeat)
+  report('current', dirs, contexts, args.renders, args.repeat)
+
+
+if __name__ == '__main__':
+  main()
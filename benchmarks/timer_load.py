@@ -0,0 +1,218 @@
+"""Load test the sync and async timer endpoints under an ASGI server.
+
+Starts uvicorn (or daphne) on localhost, logs in one load-test user per
+client, then hammers each timer endpoint in its sync and async variant and
+prints requests per second and latency percentiles:
+
+  pip install uvicorn
+  python benchmarks/timer_load.py --concurrency 50 --requests 2000
+
+The users and the server use benchmarks/settings.py, whose database is
+separate from db.sqlite3. Pass --base-url to test a server that is already
+running instead; start it with DJANGO_SETTINGS_MODULE=benchmarks.settings so
+it reads the same database. The load-test users and their todos are deleted
+when the run finishes.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# name: (sync url name, async url name, method, takes a todo id)
+ENDPOINTS = {
+  'status': ('todos:timer_status', 'todos:atimer_status', 'GET', True),
+  'check-active': ('todos:check_active_timer', 'todos:acheck_active_timer', 'GET', False),
+  'start': ('todos:start_timer', 'todos:astart_timer', 'POST', True),
+  'stop': ('todos:stop_timer', 'todos:astop_timer', 'POST', True),
+}
+USERNAME_PREFIX = 'timer-load-'
+
+
+def setup_django():
+  sys.path.insert(0, str(BASE_DIR))
+  # Never the developer's database; the server started here inherits this
+  os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+  import django
+  django.setup()
+  from django.core.management import call_command
+  call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def create_clients(count):
+  """Create one user, todo and logged-in session per client"""
+  from django.conf import settings
+  from django.contrib.auth.models import User
+  from django.middleware.csrf import _get_new_csrf_string
+  from django.test import Client
+  from todos.models import Todo
+
+  clients = []
+  for number in range(count):
+    user, _created = User.objects.get_or_create(username=f'{USERNAME_PREFIX}{number}')
+    todo = Todo.objects.create(title='Load test', user=user, duration=60)
+    client = Client()
+    client.force_login(user)
+    session = client.cookies[settings.SESSION_COOKIE_NAME].value
+    csrf = _get_new_csrf_string()
+    clients.append({
+      'todo_id': todo.id,
+      'headers': (
+        f'Cookie: {settings.SESSION_COOKIE_NAME}={session}; {settings.CSRF_COOKIE_NAME}={csrf}\r\n'
+        f'X-CSRFToken: {csrf}\r\n'
+      ),
+    })
+  return clients
+
+
+def delete_clients():
+  from django.contrib.auth.models import User
+  User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+
+def start_server(server, port):
+  commands = {
+    'uvicorn': ['-m', 'uvicorn', 'advanced_todo_list.asgi:application', '--port', str(port), '--log-level', 'warning'],
+    'daphne': ['-m', 'daphne', '-p', str(port), 'advanced_todo_list.asgi:application'],
+  }
+  process = subprocess.Popen([sys.executable, *commands[server]], cwd=BASE_DIR)
+  deadline = time.monotonic() + 30
+  while time.monotonic() < deadline:
+    if process.poll() is not None:
+      sys.exit(f'{server} exited with code {process.returncode}; is it installed?')
+    try:
+      socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+      return process
+    except OSError:
+      time.sleep(0.1)
+  process.terminate()
+  sys.exit(f'{server} did not start listening on port {port}')
+
+
+async def read_response(reader):
+  head = await reader.readuntil(b'\r\n\r\n')
+  lines = head.decode('latin-1').split('\r\n')
+  status = int(lines[0].split()[1])
+  headers = {}
+  for line in lines[1:]:
+    if ':' in line:
+      name, value = line.split(':', 1)
+      headers[name.strip().lower()] = value.strip()
+
+  if headers.get('transfer-encoding') == 'chunked':
+    while True:
+      size = int((await reader.readline()).strip(), 16)
+      await reader.readexactly(size + 2)
+      if size == 0:
+        break
+  else:
+    await reader.readexactly(int(headers.get('content-length', 0)))
+  return status, headers.get('connection', '').lower() != 'close'
+
+
+async def run_client(host, port, client, paths, method, remaining, latencies, errors):
+  """Send requests over one keep-alive connection until the shared budget is spent"""
+  reader = writer = None
+  try:
+    while remaining[0] > 0:
+      remaining[0] -= 1
+      if writer is None:
+        reader, writer = await asyncio.open_connection(host, port)
+      request = (
+        f'{method} {paths[client["todo_id"]]} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+        f'{client["headers"]}Content-Length: 0\r\n\r\n'
+      )
+      started = time.perf_counter()
+      writer.write(request.encode())
+      try:
+        status, keep_alive = await read_response(reader)
+      except (asyncio.IncompleteReadError, ConnectionError):
+        errors.append('connection')
+        writer.close()
+        writer = None
+        continue
+      latencies.append(time.perf_counter() - started)
+      if status != 200:
+        errors.append(status)
+      if not keep_alive:
+        writer.close()
+        writer = None
+  finally:
+    if writer is not None:
+      writer.close()
+
+
+async def measure(host, port, clients, paths, method, requests):
+  remaining = [requests]
+  latencies = []
+  errors = []
+  started = time.perf_counter()
+  await asyncio.gather(*(
+    run_client(host, port, client, paths, method, remaining, latencies, errors) for client in clients
+  ))
+  elapsed = time.perf_counter() - started
+  return elapsed, sorted(latencies), errors
+
+
+def percentile(values, fraction):
+  if not values:
+    return float('nan')
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--server', choices=['uvicorn', 'daphne'], default='uvicorn')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--base-url', help='Test a server that is already running, e.g. http://127.0.0.1:8000')
+  parser.add_argument('--concurrency', type=int, default=50)
+  parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and variant')
+  parser.add_argument('--endpoints', default='status,check-active', help=f'Comma separated, from {", ".join(ENDPOINTS)}')
+  args = parser.parse_args()
+
+  setup_django()
+  from django.urls import reverse
+
+  endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+  unknown = set(endpoints) - ENDPOINTS.keys()
+  if unknown:
+    parser.error(f'unknown endpoints: {", ".join(sorted(unknown))}')
+
+  host, port = '127.0.0.1', args.port
+  if args.base_url:
+    address = args.base_url.split('://', 1)[-1].rstrip('/')
+    host, _, port = address.partition(':')
+    port = int(port or 80)
+
+  clients = create_clients(args.concurrency)
+  server = None if args.base_url else start_server(args.server, port)
+  try:
+    print(f'{"endpoint":<14} {"variant":<7} {"req/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for name in endpoints:
+      sync_name, async_name, method, takes_id = ENDPOINTS[name]
+      for variant, url_name in (('sync', sync_name), ('async', async_name)):
+        paths = {
+          client['todo_id']: reverse(url_name, args=[client['todo_id']] if takes_id else [])
+          for client in clients
+        }
+        # Warm up connections, sessions and the URL resolver first
+        asyncio.run(measure(host, port, clients, paths, method, len(clients)))
+        elapsed, latencies, errors = asyncio.run(measure(host, port, clients, paths, method, args.requests))
+        print(
+          f'{name:<14} {variant:<7} {len(latencies) / elapsed:>9.1f} '
+          f'{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} {len(errors):>7}'
+        )
+  finally:
+    if server is not None:
+      server.terminate()
+      server.wait()
+    delete_clients()
+
+
+if __name__ == '__main__':
+  main()
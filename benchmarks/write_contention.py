@@ -0,0 +1,113 @@
+"""Measure concurrent timer writes on SQLite under each database profile.
+
+For each profile, seeds a fresh database file and then starts several
+processes, standing in for web workers, that start and stop timers on
+their own user's todos as fast as they can. Prints the timer switches per
+second, their latency and how many failed with "database is locked":
+
+  python benchmarks/write_contention.py
+  python benchmarks/write_contention.py --workers 8 --seconds 20
+
+Each switch is the same pair of transactions a click on Start and then
+Stop runs in the app.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PROFILES = ('development', 'production')
+USERNAME_PREFIX = 'contention-'
+
+
+def setup_django(database, profile):
+  sys.path.insert(0, str(BASE_DIR))
+  os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+  os.environ['BENCHMARK_DATABASE'] = database
+  os.environ['BENCHMARK_DATABASE_PROFILE'] = profile
+  import django
+  django.setup()
+
+
+def seed(database, profile, workers):
+  """Create the schema and one user with some todos per worker, in a subprocess"""
+  env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+         'BENCHMARK_DATABASE': database, 'BENCHMARK_DATABASE_PROFILE': profile}
+  manage = [sys.executable, str(BASE_DIR / 'manage.py')]
+  subprocess.run([*manage, 'migrate', '--run-syncdb', '-v', '0'], env=env, check=True)
+  subprocess.run([*manage, 'seed_todos', '--users', str(workers), '--todos', str(workers * 50),
+                  '--username-prefix', USERNAME_PREFIX], env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def worker(database, profile, number, seconds, start_at, results):
+  setup_django(database, profile)
+  import random
+  from django.db import OperationalError
+  from todos.models import Todo
+
+  rng = random.Random(number)
+  todos = list(Todo.objects.filter(user__username=f'{USERNAME_PREFIX}{number}'))
+  latencies = []
+  errors = 0
+  time.sleep(max(start_at - time.time(), 0))
+  deadline = time.time() + seconds
+  while time.time() < deadline:
+    todo = rng.choice(todos)
+    started = time.perf_counter()
+    try:
+      todo.start_timer()
+      todo.stop_timer()
+    except OperationalError:
+      errors += 1
+      continue
+    latencies.append((time.perf_counter() - started) * 1000)
+  results.put((latencies, errors))
+
+
+def run(profile, workers, seconds):
+  with tempfile.TemporaryDirectory() as directory:
+    database = os.path.join(directory, 'contention.sqlite3')
+    seed(database, profile, workers)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # Give every process time to start and load Django before the clock starts
+    start_at = time.time() + 3
+    processes = [
+      context.Process(target=worker, args=(database, profile, number, seconds, start_at, results))
+      for number in range(workers)
+    ]
+    for process in processes:
+      process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+      process.join()
+
+  latencies = sorted(latency for worker_latencies, _errors in outcomes for latency in worker_latencies)
+  errors = sum(errors for _latencies, errors in outcomes)
+  p95 = latencies[int(len(latencies) * 0.95)] if latencies else float('nan')
+  median = statistics.median(latencies) if latencies else float('nan')
+  print(f'{profile:>12} {len(latencies) / seconds:>9.1f} {median:>8.1f}ms {p95:>8.1f}ms {errors:>7}')
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--workers', type=int, default=4)
+  parser.add_argument('--seconds', type=float, default=10)
+  parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=PROFILES)
+  args = parser.parse_args()
+
+  print(f'{args.workers} processes for {args.seconds:g}s each')
+  print(f'{"profile":>12} {"switch/s":>9} {"p50":>10} {"p95":>10} {"locked":>7}')
+  for profile in args.profiles:
+    run(profile, args.workers, args.seconds)
+
+
+if __name__ == '__main__':
+  main()
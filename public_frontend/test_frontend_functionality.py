@@ -1,7 +1,13 @@
-# import os
+import os
 # import pathlib
 import random
-from unittest import TestCase, skip, main
+from unittest import SkipTest, TestCase, skip, main
+
+# Browser tests need Chrome and Selenium, which are slow to import; every
+# test run would pay for that even when it skips them
+if not os.environ.get('BROWSER_TESTS'):
+  raise SkipTest('Set BROWSER_TESTS=1 to run the browser tests')
+
 from django.contrib.auth.models import User
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -3,6 +3,12 @@ from django.contrib import admin
 # Register your models here.
 from todos.models import Todo
 from todos.models import TaskGroup
+from todos.models import TimerSession
+from todos.models import TodoCounter
+from todos.models import Change
 
 admin.site.register(Todo)
-admin.site.register(TaskGroup)
\ No newline at end of file
+admin.site.register(TaskGroup)
+admin.site.register(TimerSession)
+admin.site.register(TodoCounter)
+admin.site.register(Change)
\ No newline at end of file
@@ -0,0 +1,255 @@
+from django.db import models, transaction
+from django.utils import timezone
+
+from .counters import SOURCE_FIELDS, counted_update, record_bulk
+from .events import publish_event
+from .forms import NewTodoForm, UpdateTodoForm
+from .models import Change, TaskGroup, Todo
+from .search import index_todos
+from .sync import record_changes
+from .timer_cache import drop_active_timer
+
+MAX_BULK_ROWS = 1000
+
+INVALID_GROUP = 'Select a valid choice. That choice is not one of the available choices.'
+NOT_FOUND = 'Todo not found.'
+DUPLICATE_ID = 'This todo is already named earlier in this operation.'
+INVALID_VALUE = 'Enter a valid value.'
+
+# The form fields of these model fields expect strings
+STRING_FIELDS = (models.CharField, models.TextField, models.DateField)
+
+UPDATE_FIELDS = set(UpdateTodoForm._meta.fields)
+
+# The HTML form always posts priority and status; JSON rows may leave them out
+CREATE_DEFAULTS = {
+  name: Todo._meta.get_field(name).get_default()
+  for name in NewTodoForm._meta.fields if Todo._meta.get_field(name).has_default()
+}
+
+
+class BulkError(Exception):
+  """A batch that cannot be applied, with its errors keyed by operation and row"""
+  def __init__(self, errors):
+    super().__init__(errors)
+    self.errors = errors
+
+
+def _ids(values, errors):
+  ids = {}
+  seen = set()
+  for index, value in enumerate(values):
+    if isinstance(value, int) and not isinstance(value, bool):
+      pk = value
+    elif isinstance(value, str) and value.isdigit():
+      pk = int(value)
+    else:
+      errors[index] = {'id': ['Enter a valid id.']}
+      continue
+    # A todo named twice would be counted twice by the counters
+    if pk in seen:
+      errors[index] = {'id': [DUPLICATE_ID]}
+      continue
+    seen.add(pk)
+    ids[index] = pk
+  return ids
+
+
+def _type_errors(row, names):
+  """Errors for JSON values that the form fields cannot clean.
+
+  Lists and objects are never valid, and text and date fields only take
+  strings: a list title would be stored as its repr, and a number or list
+  date makes the date field raise instead of reporting an error.
+  """
+  errors = {}
+  for name in names:
+    value = row.get(name)
+    if value is None:
+      continue
+    if isinstance(value, (list, dict)) or (
+        isinstance(Todo._meta.get_field(name), STRING_FIELDS) and not isinstance(value, str)):
+      errors[name] = [INVALID_VALUE]
+  return errors
+
+
+class BulkOperation:
+  """Validate and apply a batch of todo creates, updates, moves and deletes.
+
+  Rows are validated with the same rules as NewTodoForm and UpdateTodoForm.
+  The user's groups and the todos named by the batch are each loaded with a
+  single query, which is also how ownership is enforced: ids that do not
+  belong to the user are reported as not found. Nothing is written unless
+  every row is valid, and then everything is written in one transaction.
+  """
+  def __init__(self, user, payload):
+    self.user = user
+    self.payload = payload
+    self.errors = {}
+    self._groups = None
+
+  @property
+  def groups(self):
+    if self._groups is None:
+      self._groups = set(TaskGroup.objects.filter(user=self.user).values_list('pk', flat=True))
+    return self._groups
+
+  def resolve_group(self, value):
+    """Return (group id, error) for a group given by id or null"""
+    if value in (None, ''):
+      return None, None
+    if isinstance(value, str) and value.isdigit():
+      value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value in self.groups:
+      return value, None
+    return None, INVALID_GROUP
+
+  def rows(self, operation):
+    rows = self.payload.get(operation, [])
+    if not isinstance(rows, list):
+      raise BulkError({operation: {'__all__': ['Expected a list.']}})
+    return rows
+
+  def validate_form(self, form_class, row, instance=None):
+    """Validate one row, returning (todo, group id, errors)"""
+    if not isinstance(row, dict):
+      return None, None, {'__all__': ['Expected an object.']}
+    errors = _type_errors(row, [name for name in form_class._meta.fields if name != 'group'])
+    if errors:
+      return None, None, errors
+    form = form_class({key: value for key, value in row.items() if key not in ('id', 'group')}, instance=instance)
+    # Groups are checked against the batch's single groups query instead
+    del form.fields['group']
+    if instance is not None:
+      # Updates are partial: only the fields in the row are validated and saved
+      for name in list(form.fields):
+        if name not in row:
+          del form.fields[name]
+    errors = {} if form.is_valid() else {field: list(messages) for field, messages in form.errors.items()}
+
+    group_id = instance.group_id if instance is not None else None
+    if 'group' in row:
+      group_id, group_error = self.resolve_group(row['group'])
+      if group_error:
+        errors['group'] = [group_error]
+    if errors:
+      return None, None, errors
+    return form.save(commit=False), group_id, None
+
+  def prepare_creates(self):
+    todos = []
+    for index, row in enumerate(self.rows('create')):
+      if isinstance(row, dict):
+        row = {**CREATE_DEFAULTS, **row}
+      todo, group_id, row_errors = self.validate_form(NewTodoForm, row)
+      if row_errors:
+        self.add_error('create', index, row_errors)
+        continue
+      todo.user = self.user
+      todo.group_id = group_id
+      todos.append(todo)
+    return todos
+
+  def prepare_updates(self, ids, owned):
+    rows = self.rows('update')
+    todos = []
+    fields = set()
+    previous = []
+    for index, pk in ids.items():
+      todo = owned.get(pk)
+      if todo is None:
+        self.add_error('update', index, {'id': [NOT_FOUND]})
+        continue
+      previous_values = {field: getattr(todo, field) for field in SOURCE_FIELDS}
+      todo, group_id, row_errors = self.validate_form(UpdateTodoForm, rows[index], instance=todo)
+      if row_errors:
+        self.add_error('update', index, row_errors)
+        continue
+      todo.group_id = group_id
+      fields.update(name for name in rows[index] if name in UPDATE_FIELDS)
+      previous.append(previous_values)
+      todos.append(todo)
+    return todos, fields, previous
+
+  def owned_ids(self, operation, ids, owned):
+    for index, pk in ids.items():
+      if pk not in owned:
+        self.add_error(operation, index, {'id': [NOT_FOUND]})
+    return sorted({pk for pk in ids.values() if pk in owned})
+
+  def add_error(self, operation, index, errors):
+    self.errors.setdefault(operation, {})[index] = errors
+
+  def parse_ids(self, operation, values):
+    errors = {}
+    ids = _ids(values, errors)
+    for index, row_errors in errors.items():
+      self.add_error(operation, index, row_errors)
+    return ids
+
+  def apply(self):
+    """Apply the batch and return the affected ids per operation, or raise BulkError"""
+    if not isinstance(self.payload, dict):
+      raise BulkError({'__all__': ['Expected an object.']})
+    move = self.payload.get('move', {'ids': []})
+    if not isinstance(move, dict) or not isinstance(move.get('ids', []), list):
+      raise BulkError({'move': {'__all__': ['Expected an object with a list of "ids" and a "group".']}})
+    rows = sum(len(self.rows(operation)) for operation in ('create', 'update', 'delete')) + len(move.get('ids', []))
+    if rows > MAX_BULK_ROWS:
+      raise BulkError({'__all__': [f'A batch can contain at most {MAX_BULK_ROWS} rows.']})
+
+    update_ids = self.parse_ids('update', [row.get('id') if isinstance(row, dict) else None for row in self.rows('update')])
+    move_ids = self.parse_ids('move', move.get('ids', []))
+    delete_ids = self.parse_ids('delete', self.rows('delete'))
+    # One query loads every todo the batch names; other users' todos are
+    # simply not found
+    wanted = {*update_ids.values(), *move_ids.values(), *delete_ids.values()}
+    owned = Todo.objects.filter(user=self.user, pk__in=wanted).in_bulk() if wanted else {}
+
+    creates = self.prepare_creates()
+    updates, update_fields, previous = self.prepare_updates(update_ids, owned)
+    move_ids = self.owned_ids('move', move_ids, owned)
+    move_group = None
+    if move_ids:
+      move_group, group_error = self.resolve_group(move.get('group'))
+      if group_error:
+        self.add_error('move', 'group', [group_error])
+    delete_ids = self.owned_ids('delete', delete_ids, owned)
+    if self.errors:
+      raise BulkError(self.errors)
+
+    with transaction.atomic():
+      # bulk_create, bulk_update and update() send no signals
+      created = Todo.objects.bulk_create(creates)
+      record_bulk(current_rows=[{field: getattr(todo, field) for field in SOURCE_FIELDS} for todo in created])
+      index_todos(created)
+
+      if updates:
+        now = timezone.now()
+        for todo in updates:
+          todo.updated_at = now
+        Todo.objects.bulk_update(updates, sorted(update_fields | {'updated_at'}))
+        record_bulk(previous, [{field: getattr(todo, field) for field in SOURCE_FIELDS} for todo in updates])
+        for todo, values in zip(updates, previous):
+          if todo.status != values['status']:
+            publish_event(self.user.pk, 'todo.status', {'todo_id': todo.pk, 'status': todo.status})
+        # An updated title may be the one cached for the running timer
+        drop_active_timer(self.user.pk)
+        if {'title', 'description'} & update_fields:
+          index_todos(updates)
+
+      if move_ids:
+        counted_update(Todo.objects.filter(user=self.user, pk__in=move_ids), group_id=move_group, updated_at=timezone.now())
+
+      record_changes(self.user.pk, Change.TODO, [todo.pk for todo in created] + [todo.pk for todo in updates] + move_ids)
+
+      if delete_ids:
+        # Also updates the counters, sync tombstones and search index
+        Todo.objects.filter(user=self.user, pk__in=delete_ids).delete()
+
+    return {
+      'created': [todo.pk for todo in created],
+      'updated': [todo.pk for todo in updates],
+      'moved': move_ids,
+      'deleted': delete_ids,
+    }
@@ -0,0 +1,44 @@
+import hashlib
+from datetime import datetime, time
+
+from django.utils import timezone
+
+from .fragments import last_changed, list_version
+from .models import Todo
+
+
+def _etag(*parts):
+  return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def page_etag(request, pk=None):
+  """ETag for the todo pages, from the user's list version.
+
+  The version is read from the database and changes on every write to the
+  user's todos and groups, so every worker issues and accepts the same
+  tags. The date is included because overdue counts and badges change at
+  midnight.
+  """
+  user = request.user
+  return _etag(request.path, user.pk, list_version(request), timezone.localdate(), sorted(request.GET.lists()))
+
+
+def page_last_modified(request, pk=None):
+  """The time of the user's latest sync entry, or midnight if that is later"""
+  midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+  return max(last_changed(request), midnight)
+
+
+def timer_status_etag(request, pk):
+  """ETag for a timer status poll, from one indexed lookup of the todo.
+
+  A running timer reports its elapsed seconds, so its tag changes every
+  second; a stopped timer keeps its tag until the todo changes.
+  """
+  row = Todo.objects.filter(pk=pk, user=request.user).values_list(
+      'updated_at', 'is_timer_active', 'timer_started_at').first()
+  if row is None:
+    return None
+  updated_at, is_active, started_at = row
+  elapsed = int((timezone.now() - started_at).total_seconds()) if is_active and started_at else 0
+  return _etag('timer', pk, updated_at, is_active, elapsed)
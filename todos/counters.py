@@ -0,0 +1,160 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Todo, TodoCounter
+
+
+def _key(value):
+  return value.lower().replace(' ', '_')
+
+
+STATUS_KEYS = {status: _key(status) for status, _label in Todo.STATUS_CHOICES}
+PRIORITY_KEYS = {priority: _key(priority) for priority, _label in Todo.PRIORITY_CHOICES}
+
+COUNTER_FIELDS = ('total', *STATUS_KEYS.values(), *PRIORITY_KEYS.values(), 'time_spent', 'duration')
+
+# The Todo columns that feed the counters
+SOURCE_FIELDS = ('user_id', 'group_id', 'status', 'priority', 'time_spent', 'duration')
+
+
+def counter_aggregates():
+  """Aggregate expressions that compute every counter field from Todo rows"""
+  aggregates = {'total': Count('id')}
+  for status, key in STATUS_KEYS.items():
+    aggregates[key] = Count('id', filter=Q(status=status))
+  for priority, key in PRIORITY_KEYS.items():
+    aggregates[key] = Count('id', filter=Q(priority=priority))
+  aggregates['time_spent'] = Coalesce(Sum('time_spent'), Value(0))
+  aggregates['duration'] = Coalesce(Sum('duration'), Value(0))
+  return aggregates
+
+
+def counted_values(pk):
+  """Read the counted columns of a todo as they are stored in the database"""
+  return Todo.objects.filter(pk=pk).values(*SOURCE_FIELDS).first()
+
+
+def _contribution(values):
+  contribution = Counter(total=1)
+  if values['status'] in STATUS_KEYS:
+    contribution[STATUS_KEYS[values['status']]] += 1
+  if values['priority'] in PRIORITY_KEYS:
+    contribution[PRIORITY_KEYS[values['priority']]] += 1
+  contribution['time_spent'] += values['time_spent'] or 0
+  contribution['duration'] += values['duration'] or 0
+  return contribution
+
+
+def _scopes(values):
+  scopes = [(values['user_id'], None)]
+  if values['group_id'] is not None:
+    scopes.append((values['user_id'], values['group_id']))
+  return scopes
+
+
+def _add_deltas(deltas, values, sign):
+  contribution = _contribution(values)
+  for scope in _scopes(values):
+    for field, amount in contribution.items():
+      deltas[scope][field] += sign * amount
+
+
+def _apply(deltas, create_missing):
+  for (user_id, group_id), delta in deltas.items():
+    changes = {field: F(field) + amount for field, amount in delta.items() if amount}
+    if not changes:
+      continue
+    updated = TodoCounter.objects.filter(user_id=user_id, group_id=group_id).update(**changes)
+    if not updated and create_missing:
+      # The row is built from the rows already written, so it includes this change
+      build_counters(user_id, [group_id])
+
+
+def build_counters(user_id, group_ids):
+  """Compute counter rows from scratch and store any that are missing.
+
+  ``group_ids`` may contain ``None`` for the user-wide row. Returns a dict of
+  counter values keyed by group id.
+  """
+  todos = Todo.objects.filter(user_id=user_id)
+  group_ids = set(group_ids)
+  result = {}
+  if None in group_ids:
+    result[None] = todos.aggregate(**counter_aggregates())
+  ids = [group_id for group_id in group_ids if group_id is not None]
+  if ids:
+    rows = todos.filter(group_id__in=ids).values('group_id').annotate(**counter_aggregates()).order_by()
+    for row in rows:
+      result[row.pop('group_id')] = row
+    for group_id in ids:
+      result.setdefault(group_id, dict.fromkeys(COUNTER_FIELDS, 0))
+
+  TodoCounter.objects.bulk_create(
+    [TodoCounter(user_id=user_id, group_id=group_id, **values) for group_id, values in result.items()],
+    ignore_conflicts=True,
+  )
+  return result
+
+
+def record_save(todo, previous, update_fields=None):
+  """Apply the counter changes caused by saving ``todo``"""
+  current = {field: getattr(todo, field) for field in SOURCE_FIELDS}
+  if previous is not None and update_fields is not None:
+    updated = {Todo._meta.get_field(name).attname for name in update_fields}
+    current = {field: current[field] if field in updated else previous[field] for field in SOURCE_FIELDS}
+
+  deltas = defaultdict(Counter)
+  if previous is not None:
+    _add_deltas(deltas, previous, -1)
+  _add_deltas(deltas, current, 1)
+  _apply(deltas, create_missing=True)
+
+
+def record_delete(todo):
+  """Remove a deleted todo from the counters"""
+  deltas = defaultdict(Counter)
+  _add_deltas(deltas, {field: getattr(todo, field) for field in SOURCE_FIELDS}, -1)
+  # Never create rows here: the user or group may be in the middle of a cascade
+  _apply(deltas, create_missing=False)
+
+
+def record_bulk(previous_rows=(), current_rows=()):
+  """Apply counter changes for rows written without Todo.save()/delete()"""
+  deltas = defaultdict(Counter)
+  for values in previous_rows:
+    _add_deltas(deltas, values, -1)
+  for values in current_rows:
+    _add_deltas(deltas, values, 1)
+  _apply(deltas, create_missing=True)
+
+
+def counted_update(queryset, **changes):
+  """QuerySet.update() that keeps the counters in step"""
+  with transaction.atomic():
+    rows = list(queryset.values('pk', *SOURCE_FIELDS))
+    if not rows:
+      return 0
+    updated = Todo.objects.filter(pk__in=[row['pk'] for row in rows]).update(**changes)
+    changed = {Todo._meta.get_field(name).attname: value for name, value in changes.items()}
+    record_bulk(rows, [{**row, **changed} for row in rows])
+  return updated
+
+
+def get_user_counters(user):
+  row = TodoCounter.objects.filter(user=user, group__isnull=True).values(*COUNTER_FIELDS).first()
+  if row is None:
+    row = build_counters(user.pk, [None])[None]
+  return row
+
+
+def get_group_counters(user, group_ids):
+  """Counter values for several of a user's groups, keyed by group id"""
+  rows = TodoCounter.objects.filter(user=user, group_id__in=group_ids).values('group_id', *COUNTER_FIELDS)
+  result = {row.pop('group_id'): row for row in rows}
+  missing = set(group_ids) - result.keys()
+  if missing:
+    result.update(build_counters(user.pk, missing))
+  return result
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'todos.events.InProcessBroker'
+
+
+class Subscription:
+  """A queue of events for one listener, fed by a broker"""
+  def __init__(self, broker, user_id, max_size):
+    self.broker = broker
+    self.user_id = user_id
+    self.loop = asyncio.get_running_loop()
+    self.queue = asyncio.Queue(maxsize=max_size)
+
+  def put(self, event):
+    # A slow client loses its oldest events rather than growing the queue
+    if self.queue.full():
+      self.queue.get_nowait()
+    self.queue.put_nowait(event)
+
+  async def get(self, timeout=None):
+    """Wait for the next event, or return None after ``timeout`` seconds"""
+    try:
+      return await asyncio.wait_for(self.queue.get(), timeout)
+    except asyncio.TimeoutError:
+      return None
+
+  def close(self):
+    self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+  """Fan events out to the listeners of each user within this process.
+
+  Any broker with the same ``subscribe``/``unsubscribe``/``publish`` methods,
+  for example one backed by Redis pub/sub, can be used instead through the
+  ``TODO_EVENTS_BROKER`` setting. Listeners wait on asyncio queues, so an idle
+  connection costs no thread; ``publish`` may be called from any thread.
+  """
+  def __init__(self, max_queue_size=100):
+    self.max_queue_size = max_queue_size
+    self._lock = threading.Lock()
+    self._subscriptions = defaultdict(set)
+
+  def subscribe(self, user_id):
+    subscription = Subscription(self, user_id, self.max_queue_size)
+    with self._lock:
+      self._subscriptions[user_id].add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    with self._lock:
+      subscriptions = self._subscriptions.get(subscription.user_id)
+      if subscriptions is not None:
+        subscriptions.discard(subscription)
+        if not subscriptions:
+          del self._subscriptions[subscription.user_id]
+
+  def publish(self, user_id, event):
+    with self._lock:
+      subscriptions = list(self._subscriptions.get(user_id, ()))
+    for subscription in subscriptions:
+      if subscription.loop.is_closed():
+        continue
+      subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+  def subscriber_count(self, user_id=None):
+    with self._lock:
+      if user_id is not None:
+        return len(self._subscriptions.get(user_id, ()))
+      return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+  return import_string(getattr(settings, 'TODO_EVENTS_BROKER', DEFAULT_BROKER))()
+
+
+def publish_event(user_id, event_type, data):
+  """Publish an event to a user's listeners once the current transaction commits"""
+  event = {'type': event_type, **data}
+  transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def timer_state(todo):
+  """The timer fields a listener needs to render a todo's timer"""
+  return {
+    'todo_id': todo.id,
+    'title': todo.title,
+    'is_active': todo.is_timer_active,
+    'elapsed_seconds': todo.get_elapsed_time(),
+    'time_spent': todo.time_spent or 0,
+    'time_remaining': todo.time_remaining or 0,
+    'time_completion': todo.time_completion or 0,
+    'status': todo.status,
+  }
+
+
+def format_sse(event):
+  """Encode an event dict as a Server-Sent Events message"""
+  return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
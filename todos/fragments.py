@@ -0,0 +1,90 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Change
+
+DEFAULT_FRAGMENT_CACHE = 'default'
+
+CARD_TEMPLATE = 'todos/todo_card.html'
+
+
+def fragment_cache():
+  """The cache holding rendered cards and pages, chosen by TODO_FRAGMENT_CACHE"""
+  return caches[getattr(settings, 'TODO_FRAGMENT_CACHE', DEFAULT_FRAGMENT_CACHE)]
+
+
+def card_key(todo, today):
+  # A card only changes when its row does, or when its due date becomes overdue
+  overdue = int(todo.due_date is not None and todo.due_date < today)
+  return f'todo-card:{todo.pk}:{todo.updated_at.timestamp()}:{overdue}'
+
+
+def render_cards(todos, today):
+  """Render the card of each todo, reusing every card already in the cache"""
+  cache = fragment_cache()
+  keys = [card_key(todo, today) for todo in todos]
+  cached = cache.get_many(keys)
+  rendered = {}
+  cards = []
+  for todo, key in zip(todos, keys):
+    card = cached.get(key)
+    if card is None:
+      card = rendered[key] = render_to_string(CARD_TEMPLATE, {'todo': todo, 'today': today})
+    cards.append(mark_safe(card))
+  if rendered:
+    cache.set_many(rendered)
+  return cards
+
+
+def latest_change(request):
+  """The id and time of the user's latest sync entry, or 0 and when they joined.
+
+  Every write to a user's todos and groups records a sync entry in the
+  same transaction, so this changes whenever any worker commits one. It is
+  one lookup at the end of the (user, id) index, made once per request for
+  the ETag, Last-Modified and page cache together.
+  """
+  if not hasattr(request, '_latest_todo_change'):
+    row = Change.objects.filter(user=request.user).order_by('-id').values_list('id', 'changed_at').first()
+    request._latest_todo_change = row or (0, request.user.date_joined)
+  return request._latest_todo_change
+
+
+def list_version(request):
+  """The user's list version, read from the database so every worker agrees.
+
+  The account's creation time is part of it, so a new account that reuses
+  a deleted one's id never matches that account's pages or ETags. On
+  PostgreSQL two of a user's writes can commit out of id order; a page read
+  between those commits stays cached until the user's next change.
+  """
+  change_id, _changed_at = latest_change(request)
+  return f'{request.user.date_joined.timestamp()}.{change_id}'
+
+
+def last_changed(request):
+  """When the user's todos or groups last changed"""
+  return latest_change(request)[1]
+
+
+def cached_page(request, today, build):
+  """Return a page of the todo list from the per-user cache, or build it.
+
+  ``build`` returns a (cards, next cursor) pair. Pages are keyed by the
+  user's list version, the query parameters and the date, so any change to
+  the user's todos or groups replaces every page of that user at once.
+  """
+  query = repr(sorted(request.GET.lists()))
+  digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+  key = f'todo-list:{request.user.pk}:{list_version(request)}:{today.isoformat()}:{digest}'
+  cache = fragment_cache()
+  page = cache.get(key)
+  if page is None:
+    page = build()
+    cache.set(key, page)
+  cards, next_cursor = page
+  return [mark_safe(card) for card in cards], next_cursor
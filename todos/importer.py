@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .counters import SOURCE_FIELDS, record_bulk
+from .models import Change, TaskGroup, Todo
+from .search import index_todos
+from .sync import record_changes
+
+IMPORT_BATCH_SIZE = 1000
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+# The Todo columns read from an import; anything else in a row, such as the
+# id and timestamps of an export, is ignored
+IMPORT_FIELDS = (
+  'title', 'description', 'priority', 'status', 'due_date', 'duration',
+  'time_spent', 'time_remaining', 'time_completion',
+)
+
+GROUP_NAME_FIELD = TaskGroup._meta.get_field('name')
+
+
+def guess_format(filename):
+  """The import format for a file name, or None if it is not recognised"""
+  extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+  return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+
+def text_stream(binary):
+  """Decode an uploaded or opened binary file lazily, dropping any BOM"""
+  return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def _csv_rows(stream):
+  for number, row in enumerate(csv.DictReader(stream), start=1):
+    yield number, row, None
+
+
+def _jsonl_rows(stream):
+  number = 0
+  for line in stream:
+    if not line.strip():
+      continue
+    number += 1
+    try:
+      row = json.loads(line)
+    except ValueError:
+      yield number, None, {'__all__': ['Invalid JSON.']}
+      continue
+    if not isinstance(row, dict):
+      yield number, None, {'__all__': ['Expected an object.']}
+      continue
+    yield number, row, None
+
+
+def read_rows(stream, import_format):
+  """Yield (row number, row dict, error) for each row of a text stream.
+
+  Rows are numbered from 1, not counting the CSV header. Only one row is held
+  in memory at a time. A file that is not UTF-8 or not valid CSV ends with an
+  error for the row that could not be read; the rows before it are kept.
+  """
+  rows = _csv_rows(stream) if import_format == 'csv' else _jsonl_rows(stream)
+  number = 0
+  try:
+    for number, row, errors in rows:
+      yield number, row, errors
+  except UnicodeDecodeError:
+    yield number + 1, None, {'__all__': ['The file is not UTF-8 text; the rest of it was not read.']}
+  except csv.Error as error:
+    yield number + 1, None, {'__all__': [f'Invalid CSV: {error}; the rest of the file was not read.']}
+
+
+def _messages(error):
+  return list(error.messages)
+
+
+def clean_row(row):
+  """Validate a row against the Todo field constraints.
+
+  Returns (field values, group name, errors). Blank cells count as missing,
+  so a nullable column may be left empty and priority and status fall back
+  to their defaults.
+  """
+  values = {}
+  errors = {}
+  for name in IMPORT_FIELDS:
+    field = Todo._meta.get_field(name)
+    value = row.get(name)
+    if isinstance(value, str):
+      value = value.strip()
+    if value in (None, ''):
+      if field.has_default():
+        values[name] = field.get_default()
+        continue
+      value = None if field.null else ''
+    try:
+      values[name] = field.clean(value, None)
+    except ValidationError as error:
+      errors[name] = _messages(error)
+    except (TypeError, ValueError):
+      # JSON can hold values of any type, e.g. a number for a date
+      errors[name] = _messages(ValidationError(field.error_messages.get('invalid', 'Enter a valid value.'), params={'value': value}))
+
+  group = row.get('group')
+  group = group.strip() if isinstance(group, str) else group
+  if group in (None, ''):
+    group = None
+  else:
+    try:
+      group = GROUP_NAME_FIELD.clean(str(group), None)
+    except ValidationError as error:
+      errors['group'] = _messages(error)
+  return values, group, errors
+
+
+class TodoImporter:
+  """Insert validated rows for a user in batches.
+
+  ``run`` consumes the rows lazily and yields an event for every invalid row
+  and a progress event after every batch, ending with a ``done`` event. Each
+  batch resolves its group names with one query, creates the missing groups
+  and inserts its todos with a single bulk_create, in one transaction.
+  """
+  def __init__(self, user, batch_size=IMPORT_BATCH_SIZE):
+    self.user = user
+    self.batch_size = batch_size
+    self.rows = 0
+    self.imported = 0
+    self.failed = 0
+    self.groups_created = 0
+    # Group ids by name, for every group this import has already resolved
+    self.groups = {}
+
+  def progress(self, event_type='progress'):
+    return {
+      'type': event_type,
+      'rows': self.rows,
+      'imported': self.imported,
+      'failed': self.failed,
+      'groups_created': self.groups_created,
+    }
+
+  def resolve_groups(self, names):
+    missing = set(names) - self.groups.keys()
+    if not missing:
+      return
+    existing = TaskGroup.objects.filter(user=self.user, name__in=missing).values_list('name', 'pk')
+    self.groups.update(existing)
+    new = [TaskGroup(user=self.user, name=name) for name in sorted(missing - self.groups.keys())]
+    created = TaskGroup.objects.bulk_create(new)
+    for group in created:
+      self.groups[group.name] = group.pk
+    record_changes(self.user.pk, Change.GROUP, [group.pk for group in created])
+    self.groups_created += len(new)
+
+  def flush(self, batch):
+    with transaction.atomic():
+      self.resolve_groups({group for _values, group in batch if group is not None})
+      todos = Todo.objects.bulk_create([
+        Todo(user=self.user, group_id=self.groups.get(group), **values) for values, group in batch
+      ])
+      record_bulk(current_rows=[{field: getattr(todo, field) for field in SOURCE_FIELDS} for todo in todos])
+      record_changes(self.user.pk, Change.TODO, [todo.pk for todo in todos])
+      index_todos(todos)
+    self.imported += len(todos)
+
+  def run(self, rows):
+    batch = []
+    for number, row, errors in rows:
+      self.rows += 1
+      if errors is None:
+        values, group, errors = clean_row(row)
+      if errors:
+        self.failed += 1
+        yield {'type': 'error', 'row': number, 'errors': errors}
+        continue
+      batch.append((values, group))
+      if len(batch) >= self.batch_size:
+        self.flush(batch)
+        batch = []
+        yield self.progress()
+    if batch:
+      self.flush(batch)
+    yield self.progress('done')
@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import GeneratedField, Q
+
+from .models import Todo
+from .search import search_filter
+
+PAGE_SIZE = 50
+
+STATUS_FILTERS = {
+  'pending': 'Pending',
+  'in-progress': 'In Progress',
+  'completed': 'Completed',
+}
+
+PRIORITY_FILTERS = {
+  'low': 'Low',
+  'medium': 'Medium',
+  'high': 'High',
+}
+
+# Each sort is an ordered tuple of (field, descending, nullable) keys. The last
+# key is always the primary key so that every position in the list is unique
+# and can be used as a keyset cursor. Every sort reads an index in order: the
+# priority rank and the missing due date flag, which puts the todos without
+# a due date last, are generated columns of Todo.
+SORT_ORDERS = {
+  'newest': (('created_at', True, False), ('id', True, False)),
+  'oldest': (('created_at', False, False), ('id', False, False)),
+  'priority': (('priority_rank', False, False), ('created_at', True, False), ('id', True, False)),
+  'due-date': (('due_date_missing', False, False), ('due_date', False, True), ('id', False, False)),
+}
+DEFAULT_SORT = 'newest'
+
+
+def filter_todos(user, params):
+  """The user's todos, with the search, status, priority and group filters from a query dict"""
+  todos = Todo.objects.filter(user=user)
+  search = params.get('q', '').strip()
+  if search:
+    todos = search_filter(todos, user, search)
+
+  status = STATUS_FILTERS.get(params.get('status', ''))
+  if status:
+    todos = todos.filter(status=status)
+
+  priority = PRIORITY_FILTERS.get(params.get('priority', ''))
+  if priority:
+    todos = todos.filter(priority=priority)
+
+  group_filter = params.get('group')
+  if group_filter == 'none':
+    todos = todos.filter(group__isnull=True)
+  elif group_filter and group_filter.isdigit():
+    todos = todos.filter(group_id=group_filter)
+
+  return todos
+
+
+def get_sort(params):
+  sort = params.get('sort', DEFAULT_SORT)
+  return sort if sort in SORT_ORDERS else DEFAULT_SORT
+
+
+def order_todos(todos, sort):
+  """Order a queryset by the given sort key"""
+  ordering = [f'-{field}' if descending else field for field, descending, _nullable in SORT_ORDERS[sort]]
+  return todos.order_by(*ordering)
+
+
+def encode_cursor(todo, sort):
+  values = []
+  for field, _descending, _nullable in SORT_ORDERS[sort]:
+    value = getattr(todo, field)
+    values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+  raw = json.dumps(values, separators=(',', ':')).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+  """Decode a cursor into its key values, or return None if it is invalid"""
+  keys = SORT_ORDERS[sort]
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    values = json.loads(raw)
+  except (binascii.Error, ValueError):
+    return None
+  if not isinstance(values, list) or len(values) != len(keys):
+    return None
+
+  decoded = []
+  for (field, _descending, nullable), value in zip(keys, values):
+    if value is None:
+      if not nullable:
+        return None
+      decoded.append(None)
+      continue
+    model_field = Todo._meta.get_field(field)
+    if isinstance(model_field, GeneratedField):
+      model_field = model_field.output_field
+    try:
+      decoded.append(model_field.to_python(value))
+    except (ValidationError, TypeError, ValueError):
+      return None
+  return decoded
+
+
+def _after(field, descending, value):
+  """Rows strictly after ``value`` for a single key"""
+  if value is None:
+    # Nulls are ordered by a flag key before this one, so only rows that are
+    # also null share the cursor's position on it
+    return None
+  lookup = 'lt' if descending else 'gt'
+  return Q(**{f'{field}__{lookup}': value})
+
+
+def _equal(field, value):
+  if value is None:
+    return Q(**{f'{field}__isnull': True})
+  return Q(**{field: value})
+
+
+def keyset_filter(todos, sort, values):
+  """Restrict an ordered queryset to the rows after the cursor position"""
+  keys = SORT_ORDERS[sort]
+  condition = Q(pk__in=[])
+  prefix = Q()
+  for (field, descending, _nullable), value in zip(keys, values):
+    after = _after(field, descending, value)
+    if after is not None:
+      condition |= prefix & after
+    prefix &= _equal(field, value)
+  return todos.filter(condition)
+
+
+def paginate_todos(todos, sort, cursor=None, page_size=None):
+  """Return one page of todos and the cursor for the next page.
+
+  Pages are fetched with a keyset condition instead of an OFFSET, so every
+  page costs the same regardless of how deep into the list it is.
+  """
+  page_size = page_size or PAGE_SIZE
+  todos = order_todos(todos, sort)
+  if cursor:
+    values = decode_cursor(cursor, sort)
+    if values is not None:
+      todos = keyset_filter(todos, sort, values)
+
+  page = list(todos[:page_size + 1])
+  next_cursor = None
+  if len(page) > page_size:
+    page = page[:page_size]
+    next_cursor = encode_cursor(page[-1], sort)
+  return page, next_cursor
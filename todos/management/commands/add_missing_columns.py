@@ -0,0 +1,48 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _table_state(db, table):
+  """The columns and constraint names of a table, or None if it does not exist"""
+  with db.cursor() as cursor:
+    if table not in db.introspection.table_names(cursor):
+      return None
+    columns = {column.name for column in db.introspection.get_table_description(cursor, table)}
+    return columns, set(db.introspection.get_constraints(cursor, table))
+
+
+class Command(BaseCommand):
+  help = (
+    'Add the columns and indexes of the todos models that an existing database lacks. '
+    'The apps have no migrations, and migrate --run-syncdb only creates missing tables.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    db = connections[options['database']]
+    added = []
+    with db.schema_editor() as editor:
+      for model in apps.get_app_config('todos').get_models():
+        table = model._meta.db_table
+        state = _table_state(db, table)
+        if state is None:
+          continue
+        columns, _constraints = state
+        for field in model._meta.local_concrete_fields:
+          if field.column not in columns:
+            editor.add_field(model, field)
+            added.append(f'{table}.{field.column}')
+        # Adding a column can rebuild the table with every index, so look again
+        _columns, constraints = _table_state(db, table)
+        for index in model._meta.indexes:
+          if index.name not in constraints:
+            editor.add_index(model, index)
+            added.append(index.name)
+
+    if not added:
+      self.stdout.write('The todos tables are up to date.')
+      return
+    self.stdout.write(self.style.SUCCESS(f'Added {", ".join(added)}.'))
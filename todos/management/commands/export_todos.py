@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.export import EXPORT_COLUMNS, EXPORT_FORMATS, export_lines
+from todos.listing import PRIORITY_FILTERS, SORT_ORDERS, STATUS_FILTERS
+
+
+class Command(BaseCommand):
+  help = "Stream a user's todos or groups as CSV or JSON Lines."
+
+  def add_arguments(self, parser):
+    parser.add_argument('username')
+    parser.add_argument('--kind', choices=list(EXPORT_COLUMNS), default='todos')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', dest='export_format')
+    parser.add_argument('--output', help='File to write to instead of standard output.')
+    parser.add_argument(
+      '--q', default='',
+      help="Only todos matching this search, as in the index page's search box: every word must "
+           "start a word of the title or description.")
+    parser.add_argument('--status', choices=list(STATUS_FILTERS))
+    parser.add_argument('--priority', choices=list(PRIORITY_FILTERS))
+    parser.add_argument('--group', help='A group id, or "none" for todos without a group.')
+    parser.add_argument('--sort', choices=list(SORT_ORDERS))
+
+  def handle(self, *args, **options):
+    try:
+      user = User.objects.get(username=options['username'])
+    except User.DoesNotExist:
+      raise CommandError(f'User "{options["username"]}" does not exist.')
+
+    params = {name: options[name] for name in ('q', 'status', 'priority', 'group', 'sort') if options[name]}
+    blocks = export_lines(user, options['kind'], options['export_format'], params)
+    if options['output']:
+      with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+        for block in blocks:
+          output.write(block)
+    else:
+      for block in blocks:
+        self.stdout.write(block, ending='')
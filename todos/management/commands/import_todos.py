@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.importer import IMPORT_BATCH_SIZE, IMPORT_FORMATS, TodoImporter, guess_format, read_rows, text_stream
+
+
+class Command(BaseCommand):
+  help = 'Import todos for a user from a CSV or JSON Lines file, in batches.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('username')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, dest='import_format',
+                        help='Defaults to the file extension.')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+  def handle(self, *args, **options):
+    try:
+      user = User.objects.get(username=options['username'])
+    except User.DoesNotExist:
+      raise CommandError(f'User "{options["username"]}" does not exist.')
+    import_format = options['import_format'] or guess_format(options['path'])
+    if import_format is None:
+      raise CommandError('Cannot tell the format from the file name; pass --format.')
+
+    importer = TodoImporter(user, batch_size=options['batch_size'])
+    with open(options['path'], 'rb') as binary:
+      for event in importer.run(read_rows(text_stream(binary), import_format)):
+        if event['type'] == 'error':
+          problems = '; '.join(f'{field}: {" ".join(messages)}' for field, messages in event['errors'].items())
+          self.stderr.write(f'Row {event["row"]}: {problems}')
+        elif event['type'] == 'progress':
+          self.stdout.write(f'Processed {event["rows"]} rows: imported {event["imported"]}, failed {event["failed"]}.')
+
+    self.stdout.write(self.style.SUCCESS(
+      f'Imported {importer.imported} of {importer.rows} rows. '
+      f'{importer.failed} failed. Created {importer.groups_created} groups.'
+    ))
@@ -0,0 +1,109 @@
+import importlib.util
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+ENTRY_POINTS = {
+  'wsgi': 'advanced_todo_list.wsgi',
+  'asgi': 'advanced_todo_list.asgi',
+}
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+BOOT = '''
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+'''
+
+
+class Command(BaseCommand):
+  help = (
+    'Time a cold start of the WSGI or ASGI application in fresh interpreters and '
+    'report where the import time goes, per app or package and per module.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--entry-point', choices=ENTRY_POINTS, default='wsgi')
+    parser.add_argument('--runs', type=int, default=5, help='Interpreters to start; the fastest is broken down.')
+    parser.add_argument('--limit', type=int, default=15, help='Slowest modules to list.')
+
+  def handle(self, *args, **options):
+    code = BOOT.format(module=ENTRY_POINTS[options['entry_point']])
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)}
+    runs = []
+    for _ in range(options['runs']):
+      result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=env, cwd=settings.BASE_DIR, check=True, capture_output=True, text=True,
+      )
+      runs.append((float(result.stdout.split()[-1]), result.stderr))
+
+    seconds = sorted(wall for wall, _stderr in runs)
+    self.stdout.write(
+      f"{options['entry_point']}.application cold start over {len(runs)} runs: "
+      f'fastest {seconds[0] * 1000:.0f}ms, median {statistics.median(seconds) * 1000:.0f}ms'
+    )
+
+    modules = parse_importtime(min(runs)[1])
+    self.stdout.write('\nImport time by app or package (self time of its modules):')
+    totals = by_package(modules, ENTRY_POINTS[options['entry_point']])
+    for package, micros in sorted(totals.items(), key=lambda item: -item[1])[:options['limit']]:
+      self.stdout.write(f'  {micros / 1000:>8.1f}ms  {package}')
+    self.stdout.write('\nSlowest modules (self time, cumulative time):')
+    for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[1])[:options['limit']]:
+      self.stdout.write(f'  {self_us / 1000:>8.1f}ms {cumulative_us / 1000:>8.1f}ms  {name}')
+
+    stale = stale_bytecode(name for name, _self_us, _cumulative_us in modules)
+    if stale:
+      self.stdout.write(self.style.WARNING(
+        f'\n{len(stale)} project modules are compiled from source on every start, e.g. '
+        f'{", ".join(stale[:3])}. Run "python -m compileall ." when deploying.'
+      ))
+
+
+def parse_importtime(stderr):
+  """(module, self microseconds, cumulative microseconds) for each import -X importtime logged"""
+  return [
+    (match[4], int(match[1]), int(match[2]))
+    for match in map(IMPORT_LINE.match, stderr.splitlines()) if match
+  ]
+
+
+def by_package(modules, entry_point):
+  """Self time summed per project app, or per top-level package for everything else"""
+  apps = {name.split('.')[0] for name in settings.INSTALLED_APPS} | {'advanced_todo_list'}
+  totals = defaultdict(int)
+  for name, self_us, _cumulative_us in modules:
+    if name == entry_point:
+      # Not imports: django.setup() populating the apps, and loading the middleware
+      totals['django.setup() and middleware'] += self_us
+      continue
+    top = name.split('.')[0]
+    if top == 'django' and name.startswith('django.contrib.'):
+      top = '.'.join(name.split('.')[:3])
+    totals[top if top in apps or not top.startswith('_') else 'stdlib internals'] += self_us
+  return totals
+
+
+def stale_bytecode(names):
+  """The project modules among names whose bytecode is missing or older than their source"""
+  packages = {path.name for path in settings.BASE_DIR.iterdir() if (path / '__init__.py').exists()}
+  stale = []
+  for name in names:
+    spec = importlib.util.find_spec(name) if name.split('.')[0] in packages else None
+    if spec is None or not spec.has_location or not spec.origin.endswith('.py'):
+      continue
+    cached = importlib.util.cache_from_source(spec.origin)
+    if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(spec.origin):
+      stale.append(name)
+  return stale
+
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from todos.search import create_search_index, rebuild_search_index, search_enabled
+
+
+class Command(BaseCommand):
+  help = 'Refill the full-text search index of todo titles and descriptions from the todos table.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    using = options['database']
+    if not search_enabled(connections[using]):
+      self.stdout.write('This database searches without an index; nothing to rebuild.')
+      return
+    with transaction.atomic(using=using):
+      create_search_index(using=using)
+      rebuild_search_index(using)
+    self.stdout.write(self.style.SUCCESS('Rebuilt the search index.'))
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from todos.counters import SOURCE_FIELDS, record_bulk
+from todos.models import Change, TimerSession, Todo, timer_progress
+from todos.sync import record_changes
+
+UPDATE_FIELDS = ['tracked_seconds', 'time_spent', 'time_remaining', 'time_completion', 'updated_at']
+
+
+class Command(BaseCommand):
+  help = 'Recompute tracked_seconds and time_spent for every todo from its timer sessions.'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--reset', action='store_true',
+      help='Set time_spent to the tracked minutes, dropping manual adjustments.')
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing anything.')
+    parser.add_argument('--batch-size', type=int, default=1000)
+
+  def handle(self, *args, **options):
+    # Each todo's session total comes from a correlated subquery on the
+    # (todo, stopped_at) index, so only one chunk of todos is held at a time
+    session_seconds = Subquery(
+      TimerSession.objects.filter(todo=OuterRef('pk'), seconds__isnull=False)
+      .order_by().values('todo').annotate(total=Sum('seconds')).values('total')
+    )
+    todos = (
+      Todo.objects.annotate(session_seconds=session_seconds)
+      .filter(Q(session_seconds__isnull=False) | ~Q(tracked_seconds=0))
+      .order_by('pk')
+    )
+
+    checked = 0
+    changed = 0
+    last_pk = 0
+    while True:
+      # One transaction per chunk, with its rows locked so a timer stopped
+      # meanwhile is not overwritten
+      with transaction.atomic():
+        chunk = list(todos.filter(pk__gt=last_pk).select_for_update(of=('self',))[:options['batch_size']])
+        if not chunk:
+          break
+        last_pk = chunk[-1].pk
+        checked += len(chunk)
+        updates, previous_rows = self.recompute(chunk, options['reset'])
+        changed += len(updates)
+        if updates and not options['dry_run']:
+          self.save(updates, previous_rows)
+
+    action = 'Would update' if options['dry_run'] else 'Updated'
+    self.stdout.write(self.style.SUCCESS(f'Checked {checked} todos. {action} {changed}.'))
+
+  def recompute(self, todos, reset):
+    """Return the todos whose values change, with their previous counter fields"""
+    updates = []
+    previous_rows = []
+    for todo in todos:
+      tracked_seconds = todo.session_seconds or 0
+      if reset:
+        time_spent = tracked_seconds // 60
+      else:
+        # Shift by the change in tracked minutes so manual edits are kept
+        time_spent = (todo.time_spent or 0) + tracked_seconds // 60 - todo.tracked_seconds // 60
+      values = {'tracked_seconds': tracked_seconds, 'time_spent': time_spent,
+                **timer_progress(todo.duration, time_spent)}
+      if all(getattr(todo, field) == value for field, value in values.items()):
+        continue
+      previous_rows.append({field: getattr(todo, field) for field in SOURCE_FIELDS})
+      for field, value in values.items():
+        setattr(todo, field, value)
+      updates.append(todo)
+    return updates, previous_rows
+
+  def save(self, todos, previous_rows):
+    now = timezone.now()
+    for todo in todos:
+      # Moves the todo's cached card to a new key
+      todo.updated_at = now
+    Todo.objects.bulk_update(todos, UPDATE_FIELDS)
+    record_bulk(previous_rows, [{field: getattr(todo, field) for field in SOURCE_FIELDS} for todo in todos])
+    for user_id in {todo.user_id for todo in todos}:
+      record_changes(user_id, Change.TODO, [todo.pk for todo in todos if todo.user_id == user_id])
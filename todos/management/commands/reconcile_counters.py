@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from todos.counters import COUNTER_FIELDS, counter_aggregates
+from todos.models import Todo, TodoCounter
+
+
+class Command(BaseCommand):
+  help = 'Rebuild the TodoCounter rows from the todos table and report any drift.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--dry-run', action='store_true', help='Report drift without writing anything.')
+    parser.add_argument('--batch-size', type=int, default=1000)
+
+  def handle(self, *args, **options):
+    expected = {}
+    for row in Todo.objects.values('user_id').annotate(**counter_aggregates()).order_by().iterator():
+      expected[(row.pop('user_id'), None)] = row
+    grouped = Todo.objects.filter(group__isnull=False).values('user_id', 'group_id')
+    for row in grouped.annotate(**counter_aggregates()).order_by().iterator():
+      expected[(row.pop('user_id'), row.pop('group_id'))] = row
+
+    zero = dict.fromkeys(COUNTER_FIELDS, 0)
+    drifted = []
+    seen = set()
+    for counter in TodoCounter.objects.iterator():
+      key = (counter.user_id, counter.group_id)
+      seen.add(key)
+      values = expected.get(key, zero)
+      if any(getattr(counter, field) != values[field] for field in COUNTER_FIELDS):
+        if options['verbosity'] > 1:
+          diff = ', '.join(
+            f'{field} {getattr(counter, field)} -> {values[field]}'
+            for field in COUNTER_FIELDS if getattr(counter, field) != values[field]
+          )
+          self.stdout.write(f'Drift for user {key[0]}, group {key[1]}: {diff}')
+        for field in COUNTER_FIELDS:
+          setattr(counter, field, values[field])
+        drifted.append(counter)
+
+    missing = [
+      TodoCounter(user_id=user_id, group_id=group_id, **values)
+      for (user_id, group_id), values in expected.items()
+      if (user_id, group_id) not in seen
+    ]
+
+    if not options['dry_run']:
+      with transaction.atomic():
+        TodoCounter.objects.bulk_update(drifted, COUNTER_FIELDS, batch_size=options['batch_size'])
+        TodoCounter.objects.bulk_create(missing, batch_size=options['batch_size'], ignore_conflicts=True)
+
+    action = 'Found' if options['dry_run'] else 'Fixed'
+    self.stdout.write(self.style.SUCCESS(
+      f'Checked {len(seen)} counters. {action} {len(drifted)} drifted and {len(missing)} missing.'
+    ))
@@ -0,0 +1,308 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from todos.models import TaskGroup, TimerSession, Todo, timer_progress
+from todos.search import SEARCH_TABLE, search_enabled
+from todos.timer_cache import drop_active_timer
+
+WORDS = (
+  'report budget meeting release deploy review invoice dentist garden groceries backup server '
+  'laptop migrate database design sketch write draft email call plan trip flight hotel renew '
+  'passport insurance taxes refactor tests docs clean kitchen book tickets pay rent fix bike '
+  'order parts prepare slides update resume interview schedule team lunch read chapter water '
+  'plants walk dog buy gift birthday party research vendors quarterly goals onboarding notes'
+).split()
+GROUP_NAMES = ('Work', 'Home', 'Errands', 'Health', 'Finance', 'Learning', 'Side project', 'Travel', 'Family')
+
+# (value, weight) pairs for each column
+STATUSES = (('Pending', 45), ('In Progress', 15), ('Completed', 40))
+PRIORITIES = (('Low', 30), ('Medium', 50), ('High', 20))
+DURATIONS = ((None, 35), (15, 10), (30, 15), (45, 8), (60, 14), (90, 7), (120, 6), (180, 3), (240, 2))
+
+# Share of the todos of each status that have timer history
+TRACKED = {'Pending': 0.1, 'In Progress': 0.7, 'Completed': 0.8}
+# Share of the users with a timer running
+ACTIVE_TIMER_USERS = 0.05
+# Share of the todos without a due date
+UNDATED = 0.4
+
+DAY = 86400
+HISTORY_DAYS = 365
+
+# Values drawn once and then sampled per row: drawing titles, due dates and
+# session lengths from their distributions row by row is most of the cost
+POOL_SIZE = 4096
+
+TODO_FIELDS = (
+  'id', 'user', 'group', 'title', 'description', 'due_date', 'priority', 'status', 'duration',
+  'created_at', 'updated_at', 'time_completion', 'time_spent', 'time_remaining', 'is_timer_active',
+  'timer_started_at', 'tracked_seconds',
+)
+SESSION_FIELDS = ('todo', 'user', 'started_at', 'stopped_at', 'seconds')
+
+
+def _insert_sql(model, fields):
+  quote = connection.ops.quote_name
+  columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+  return f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({", ".join(["%s"] * len(fields))})'
+
+
+def _picker(rng, pairs):
+  """Return a function drawing k values with the given weights"""
+  values = [value for value, _weight in pairs]
+  cum_weights = list(accumulate(weight for _value, weight in pairs))
+  return lambda k: rng.choices(values, cum_weights=cum_weights, k=k)
+
+
+class Command(BaseCommand):
+  help = (
+    'Generate users, task groups, todos and timer history for load testing, with '
+    'batched raw inserts in large transactions. The same --seed always produces the same data.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--todos', type=int, default=100000, help='Todos in total, spread unevenly over the users.')
+    parser.add_argument('--groups-per-user', type=int, default=4, help='The most groups a user gets.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Todos per executemany().')
+    parser.add_argument('--transaction-size', type=int, default=500000,
+                        help='Todos per transaction when adding to existing todos.')
+    parser.add_argument('--username-prefix', default='seed-')
+    parser.add_argument('--skip-search-index', action='store_true',
+                        help='Leave the new todos out of the search index; rebuild_search_index adds them later.')
+
+  def handle(self, *args, **options):
+    prefix = options['username_prefix']
+    if options['users'] < 1:
+      raise CommandError('--users must be at least 1.')
+    if User.objects.filter(username__startswith=prefix).exists():
+      raise CommandError(f'Users named {prefix}* already exist; pick another --username-prefix.')
+
+    self.rng = random.Random(options['seed'])
+    self.prepare(timezone.now())
+    started = time.perf_counter()
+
+    users = self.create_users(options['users'], prefix)
+    groups = self.create_groups(users, options['groups_per_user'])
+    counts = self.todo_counts(users, options['todos'])
+    first_id = (Todo.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    active_users = set(self.rng.sample(users, round(len(users) * ACTIVE_TIMER_USERS)))
+
+    insert_started = time.perf_counter()
+    todo_sql = _insert_sql(Todo, TODO_FIELDS)
+    session_sql = _insert_sql(TimerSession, SESSION_FIELDS)
+    batches = self.batches(users, groups, counts, first_id, active_users, options['batch_size'])
+    todos = sessions = 0
+    # Into empty tables, everything goes in one transaction with the
+    # secondary indexes dropped, and they are built again at the end
+    fresh = first_id == 1 and connection.vendor == 'sqlite'
+    transaction_size = options['todos'] if fresh else options['transaction_size']
+    with connection.cursor() as cursor:
+      while todos < options['todos']:
+        with transaction.atomic(), self.deferred_indexes(cursor, fresh):
+          committed = todos
+          for todo_rows, session_rows in batches:
+            cursor.executemany(todo_sql, todo_rows)
+            cursor.executemany(session_sql, session_rows)
+            todos += len(todo_rows)
+            sessions += len(session_rows)
+            if todos - committed >= transaction_size:
+              break
+        if todos < options['todos']:
+          rate = (todos + sessions) / (time.perf_counter() - insert_started)
+          self.stdout.write(f'{todos} todos, {rate:,.0f} rows/s')
+      # The todo ids were given explicitly, so move the id sequence past them
+      for sql in connection.ops.sequence_reset_sql(no_style(), [Todo]):
+        cursor.execute(sql)
+    inserted = time.perf_counter() - insert_started
+
+    if search_enabled() and not options['skip_search_index']:
+      with connection.cursor() as cursor:
+        cursor.execute(
+          f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, user_id) "
+          f"SELECT id, title, COALESCE(description, ''), user_id FROM {Todo._meta.db_table} WHERE id >= %s",
+          [first_id],
+        )
+    # User ids can be reused after a flush, so drop anything cached under them
+    for user_id in users:
+      drop_active_timer(user_id)
+
+    self.stdout.write(self.style.SUCCESS(
+      f'Created {len(users)} users, {sum(len(ids) for ids in groups.values())} groups, {todos} todos and '
+      f'{sessions} timer sessions in {time.perf_counter() - started:.1f}s '
+      f'({(todos + sessions) / inserted:,.0f} rows/s inserted).'
+    ))
+
+  @contextmanager
+  def deferred_indexes(self, cursor, defer):
+    """Drop the secondary indexes of the todo and session tables, and create them again on exit.
+
+    Building an index from the finished table sorts it once, which is much
+    cheaper than updating eight B-trees on every insert. Must run inside a
+    transaction, so a failed load keeps its indexes.
+    """
+    if not defer:
+      yield
+      return
+    cursor.execute(
+      "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN (%s, %s)",
+      [Todo._meta.db_table, TimerSession._meta.db_table],
+    )
+    indexes = cursor.fetchall()
+    for name, _sql in indexes:
+      cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    yield
+    for _name, sql in indexes:
+      cursor.execute(sql)
+
+  def prepare(self, now):
+    """Draw the value pools and build the timestamp formatter.
+
+    Times are handled as whole seconds since the epoch and only turned into
+    the database's own date and datetime values as the rows are built.
+    """
+    rng = self.rng
+    self.now = int(now.timestamp())
+    self.today = self.now // DAY
+    self.statuses = _picker(rng, STATUSES)
+    self.priorities = _picker(rng, PRIORITIES)
+    self.durations = _picker(rng, DURATIONS)
+
+    self.titles = [' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize() for _ in range(POOL_SIZE)]
+    self.descriptions = [' '.join(rng.choices(WORDS, k=rng.randint(0, 15))) or None for _ in range(POOL_SIZE)]
+    # Due dates fall around ten days after the todo was created, some of them overdue
+    self.due_offsets = [None if rng.random() < UNDATED else int(rng.gauss(10, 20)) for _ in range(POOL_SIZE)]
+    # Timer sessions last about half an hour, a few of them up to four hours
+    self.session_lengths = [min(int(rng.lognormvariate(7.3, 0.8)), 4 * 3600) for _ in range(POOL_SIZE)]
+
+    epoch = date(1970, 1, 1)
+    self.first_day = self.today - HISTORY_DAYS - 200
+    self.days = [
+      connection.ops.adapt_datefield_value(epoch + timedelta(days=day))
+      for day in range(self.first_day, self.today + 200)
+    ]
+    # Naive local times when the project doesn't use time zones
+    self.tz = dt_timezone.utc if settings.USE_TZ else None
+    self.adapt_datetime = connection.ops.adapt_datetimefield_value
+
+  def stamp(self, seconds):
+    return self.adapt_datetime(datetime.fromtimestamp(seconds, self.tz))
+
+  def create_users(self, count, prefix):
+    password = make_password(None)
+    joined = timezone.now() - timedelta(days=HISTORY_DAYS)
+    User.objects.bulk_create(
+      [User(username=f'{prefix}{number}', password=password, date_joined=joined) for number in range(count)],
+      batch_size=1000,
+    )
+    return list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+
+  def create_groups(self, users, most):
+    rng = self.rng
+    TaskGroup.objects.bulk_create([
+      TaskGroup(user_id=user_id, name=name)
+      for user_id in users for name in rng.sample(GROUP_NAMES, rng.randint(0, min(most, len(GROUP_NAMES))))
+    ], batch_size=5000)
+    groups = {user_id: [] for user_id in users}
+    for group_id, user_id in TaskGroup.objects.filter(user_id__in=users).values_list('id', 'user_id').iterator():
+      groups[user_id].append(group_id)
+    return groups
+
+  def todo_counts(self, users, total):
+    """A heavy-tailed share of the todos for each user, summing to total"""
+    weights = [self.rng.paretovariate(1.2) for _ in users]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in range(total - sum(counts)):
+      counts[index % len(counts)] += 1
+    return counts
+
+  def batches(self, users, groups, counts, first_id, active_users, batch_size):
+    """Yield lists of todo rows and timer session rows, about batch_size todos at a time"""
+    todo_rows, session_rows = [], []
+    next_id = first_id
+    for user_id, count in zip(users, counts):
+      self.add_user_todos(todo_rows, session_rows, user_id, groups[user_id], count, next_id, user_id in active_users)
+      next_id += count
+      if len(todo_rows) >= batch_size:
+        yield todo_rows, session_rows
+        todo_rows, session_rows = [], []
+    if todo_rows:
+      yield todo_rows, session_rows
+
+  def add_user_todos(self, rows, sessions, user_id, group_ids, count, first_id, has_active_timer):
+    """Append the rows of one user's todos and their timer sessions"""
+    rng = self.rng
+    uniform = rng.random
+    pool_index = rng.getrandbits
+    pool_bits = POOL_SIZE.bit_length() - 1
+    stamp = self.stamp
+    now = self.now
+    today = self.today
+
+    statuses = self.statuses(count)
+    priorities = self.priorities(count)
+    durations = self.durations(count)
+    groups = rng.choices(group_ids + [None], k=count)
+    titles = rng.choices(self.titles, k=count)
+    descriptions = rng.choices(self.descriptions, k=count)
+    due_offsets = rng.choices(self.due_offsets, k=count)
+    # Todos are created in id order over the past year
+    created = sorted(now - int(uniform() * HISTORY_DAYS * DAY) for _ in range(count))
+    active_index = statuses.index('In Progress') if has_active_timer and 'In Progress' in statuses else None
+
+    for index in range(count):
+      todo_id = first_id + index
+      status = statuses[index]
+      duration = durations[index]
+      created_at = created[index]
+      updated_at = created_at + int((now - created_at) * uniform())
+
+      due_date = None
+      if due_offsets[index] is not None:
+        due_day = created_at // DAY + due_offsets[index]
+        if status == 'Completed' and due_day > today:
+          due_day = today
+        due_date = self.days[due_day - self.first_day]
+
+      tracked = 0
+      if uniform() < TRACKED[status]:
+        started = created_at
+        for _ in range(1 + int(rng.expovariate(0.7))):
+          started += 600 + int(uniform() * (DAY - 600))
+          if started >= now:
+            break
+          seconds = min(self.session_lengths[pool_index(pool_bits)], now - started)
+          sessions.append((todo_id, user_id, stamp(started), stamp(started + seconds), seconds))
+          tracked += seconds
+          started += seconds
+
+      timer_started_at = None
+      if index == active_index:
+        timer_started_at = now - 60 - int(uniform() * 7200)
+        sessions.append((todo_id, user_id, stamp(timer_started_at), None, None))
+        updated_at = timer_started_at
+        timer_started_at = stamp(timer_started_at)
+
+      time_spent = tracked // 60 or None
+      progress = timer_progress(duration, time_spent or 0)
+      time_completion = 100 if duration and status == 'Completed' else progress.get('time_completion')
+
+      rows.append((
+        todo_id, user_id, groups[index], titles[index], descriptions[index], due_date, priorities[index],
+        status, duration, stamp(created_at), stamp(updated_at), time_completion, time_spent,
+        progress.get('time_remaining'), index == active_index, timer_started_at, tracked,
+      ))
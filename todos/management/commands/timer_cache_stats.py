@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from todos.timer_cache import reset_timer_cache_stats, timer_cache, timer_cache_stats
+
+
+class Command(BaseCommand):
+  help = (
+    'Report the hit rate of the active-timer cache. The cache, and so the '
+    'counts, are only used when the fragment cache is shared between processes.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--reset', action='store_true', help='Clear the counts after reporting them.')
+
+  def handle(self, *args, **options):
+    if timer_cache() is None:
+      self.stdout.write('The active-timer cache is off: the fragment cache is local to each process.')
+      return
+    stats = timer_cache_stats()
+    hit_rate = 'n/a' if stats['hit_rate'] is None else f"{stats['hit_rate']:.1%}"
+    self.stdout.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {hit_rate}")
+    if options['reset']:
+      reset_timer_cache_stats()
+      self.stdout.write(self.style.SUCCESS('Counts reset.'))
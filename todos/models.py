@@ -1,9 +1,53 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .events import publish_event, timer_state
+
 # Create your models here.
 
+TIMER_START_ATTEMPTS = 3
+
+
+def timer_progress(duration, time_spent):
+  """time_remaining and time_completion for a todo with a duration"""
+  if not duration:
+    return {}
+  progress = {'time_remaining': duration - time_spent}
+  # Calculate completion percentage
+  if time_spent > 0:
+    progress['time_completion'] = min(int((time_spent / duration) * 100), 100)
+  return progress
+
+
+def _by_user(rows):
+  """Group (pk, user id) pairs into lists of pks by user id"""
+  ids = {}
+  for pk, user_id in rows:
+    ids.setdefault(user_id, []).append(pk)
+  return ids
+
+
+class TodoQuerySet(models.QuerySet):
+  def delete(self):
+    """Delete the todos, with their counters, sync tombstones and search rows.
+
+    Deleting a single todo does this in its signals. Queryset deletes, such
+    as the admin's "Delete selected" action, do it here for all their rows
+    at once, and the signals leave them alone.
+    """
+    from .counters import SOURCE_FIELDS, record_bulk
+    from .search import unindex_todos
+    from .sync import record_changes
+    with transaction.atomic(using=self.db):
+      rows = list(self.values('pk', *SOURCE_FIELDS))
+      record_bulk(previous_rows=rows)
+      for user_id, ids in _by_user((row['pk'], row['user_id']) for row in rows).items():
+        record_changes(user_id, Change.TODO, ids, deleted=True)
+      unindex_todos([row['pk'] for row in rows])
+      return super().delete()
+
 
 class Todo(models.Model):
 
@@ -34,51 +78,197 @@ class Todo(models.Model):
   time_remaining = models.IntegerField(null=True, blank=True)
   is_timer_active = models.BooleanField(default=False)
   timer_started_at = models.DateTimeField(null=True, blank=True)
+  # Exact total of all finished timer sessions; time_spent is kept in minutes
+  tracked_seconds = models.BigIntegerField(default=0)
+  # Sort keys kept by the database on every write, so the priority and due
+  # date sorts read an index in order instead of sorting the user's rows
+  priority_rank = models.GeneratedField(
+    expression=models.Case(
+      models.When(priority='High', then=models.Value(0)),
+      models.When(priority='Medium', then=models.Value(1)),
+      models.When(priority='Low', then=models.Value(2)),
+      default=models.Value(3),
+    ),
+    output_field=models.IntegerField(),
+    db_persist=True,
+  )
+  due_date_missing = models.GeneratedField(
+    expression=models.Case(models.When(due_date__isnull=True, then=models.Value(1)), default=models.Value(0)),
+    output_field=models.IntegerField(),
+    db_persist=True,
+  )
+
+  objects = TodoQuerySet.as_manager()
+
+  class Meta:
+    indexes = [
+      # The todo list always filters on the owner and pages by created_at/id
+      models.Index(fields=['user', 'created_at'], name='todo_user_created_idx'),
+      models.Index(fields=['user', 'status', 'created_at'], name='todo_user_status_idx'),
+      models.Index(fields=['user', 'priority', 'created_at'], name='todo_user_priority_idx'),
+      models.Index(fields=['user', 'group', 'created_at'], name='todo_user_group_idx'),
+      models.Index(fields=['user', 'due_date'], name='todo_user_due_date_idx'),
+      # In the order of the priority and due-date sorts
+      models.Index(fields=['user', 'priority_rank', '-created_at', '-id'], name='todo_user_priority_sort_idx'),
+      models.Index(fields=['user', 'due_date_missing', 'due_date', 'id'], name='todo_user_due_sort_idx'),
+    ]
+    constraints = [
+      # A user can only have one running timer at a time
+      models.UniqueConstraint(
+        fields=['user'],
+        condition=models.Q(is_timer_active=True),
+        name='todo_one_active_timer_per_user',
+      ),
+    ]
 
   def __str__(self):
     return self.title
+
+  def save(self, *args, **kwargs):
+    from .counters import counted_values, record_save
+    with transaction.atomic():
+      previous = counted_values(self.pk) if self.pk else None
+      super().save(*args, **kwargs)
+      record_save(self, previous, kwargs.get('update_fields'))
+      if previous is not None and previous['status'] != self.status:
+        publish_event(self.user_id, 'todo.status', {'todo_id': self.pk, 'status': self.status})
+
+  def delete(self, *args, **kwargs):
+    from .counters import record_delete
+    with transaction.atomic():
+      result = super().delete(*args, **kwargs)
+      record_delete(self)
+    return result
   
   def start_timer(self):
-    """Start the timer for this task"""
-    # Stop any other active timers for this user
-    Todo.objects.filter(
-        user=self.user, 
-        is_timer_active=True
-    ).exclude(pk=self.pk).update(
-        is_timer_active=False,
-        timer_started_at=None,
-        status='Pending'
-    )
-    
-    # Start this timer
+    """Start the timer for this task, stopping any other running timer.
+
+    Both steps are conditional UPDATEs in one transaction. If a concurrent
+    request starts another timer first, the partial unique index on active
+    timers rejects the second one and the switch is retried.
+    """
+    from .counters import counted_update
+    for attempt in range(TIMER_START_ATTEMPTS):
+      now = timezone.now()
+      try:
+        with transaction.atomic():
+          # Stop any other active timers for this user, recording their time
+          for other in Todo.objects.filter(user_id=self.user_id, is_timer_active=True).exclude(pk=self.pk):
+            other.stop_timer(now=now)
+          # Start this timer unless it is already running
+          started = counted_update(
+              Todo.objects.filter(pk=self.pk, is_timer_active=False),
+              **self._start_changes(now)
+          )
+          if started:
+            self._record_start(now)
+        break
+      except IntegrityError:
+        if attempt == TIMER_START_ATTEMPTS - 1:
+          raise
+
+    if started:
+      self._started(now)
+    else:
+      self.refresh_from_db(fields=['is_timer_active', 'timer_started_at', 'status', 'updated_at'])
+  
+  def stop_timer(self, now=None):
+    """Stop the timer, close its session and update time_spent.
+
+    The elapsed time is computed from the stored start time, and only the
+    request whose UPDATE still sees that start time gets to record it.
+    Seconds are accumulated in tracked_seconds, so time_spent gains a minute
+    each time the total crosses one instead of truncating every session.
+
+    Returns False if the timer is still running afterwards, because another
+    request restarted it in the meantime, and True otherwise.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+      row = self._timer_row().first()
+      if row is None or row['timer_started_at'] is None:
+        return True
+      seconds, changes = self._stop_changes(row, now)
+      updated = Todo.objects.filter(
+          pk=self.pk, is_timer_active=True, timer_started_at=row['timer_started_at']
+      ).update(**changes)
+      if not updated:
+        return not self._timer_row().exists()
+      self._record_stop(row, changes, seconds, now)
+    self._stopped(changes)
+    return True
+
+  async def astart_timer(self):
+    # The conditional UPDATEs and their bookkeeping must share a transaction,
+    # which the async ORM cannot hold, so they run on the sync executor
+    return await sync_to_async(self.start_timer)()
+
+  async def astop_timer(self, now=None):
+    return await sync_to_async(self.stop_timer)(now=now)
+
+  def _start_changes(self, now):
+    return {'is_timer_active': True, 'timer_started_at': now, 'status': 'In Progress', 'updated_at': now}
+
+  def _record_start(self, now):
+    """Open the session of a timer that was just started"""
+    from .sync import record_changes
+    from .timer_cache import remember_active_timer
+    TimerSession.objects.create(todo_id=self.pk, user_id=self.user_id, started_at=now)
+    record_changes(self.user_id, Change.TODO, [self.pk])
+    self.timer_started_at = now
+    remember_active_timer(self)
+
+  def _started(self, now):
     self.is_timer_active = True
-    self.timer_started_at = timezone.now()
+    self.timer_started_at = now
     self.status = 'In Progress'
-    self.save()
-  
-  def stop_timer(self):
-    """Stop the timer and update time_spent"""
-    if self.is_timer_active and self.timer_started_at:
-      # Calculate elapsed time in minutes
-      elapsed_seconds = (timezone.now() - self.timer_started_at).total_seconds()
-      elapsed_minutes = int(elapsed_seconds / 60)
-      
-      # Update time_spent
-      self.time_spent = (self.time_spent or 0) + elapsed_minutes
-      
-      # Update time_remaining if duration exists
-      if self.duration:
-        self.time_remaining = self.duration - self.time_spent
-        # Calculate completion percentage
-        if self.time_spent > 0:
-          self.time_completion = min(int((self.time_spent / self.duration) * 100), 100)
-      
-      # Reset timer fields
-      self.is_timer_active = False
-      self.timer_started_at = None
-      self.status = 'Pending'
-      self.save()
-    
+    self.updated_at = now
+    publish_event(self.user_id, 'timer.started', timer_state(self))
+
+  def _timer_row(self):
+    from .counters import SOURCE_FIELDS
+    return Todo.objects.filter(pk=self.pk, is_timer_active=True).values(
+        'timer_started_at', 'tracked_seconds', *SOURCE_FIELDS)
+
+  def _stop_changes(self, row, now):
+    """The seconds of the session ending at ``now`` and the todo's new values"""
+    started_at = row['timer_started_at']
+    seconds = max(int((now - started_at).total_seconds()), 0)
+    tracked_seconds = row['tracked_seconds'] + seconds
+    time_spent = (row['time_spent'] or 0) + tracked_seconds // 60 - row['tracked_seconds'] // 60
+    return seconds, {
+        'tracked_seconds': tracked_seconds,
+        'time_spent': time_spent,
+        'is_timer_active': False,
+        'timer_started_at': None,
+        'status': 'Pending',
+        'updated_at': now,
+        **timer_progress(row['duration'], time_spent),
+    }
+
+  def _record_stop(self, row, changes, seconds, now):
+    """Record a stop that was just written: counters, sync entry, cache and session"""
+    from .counters import record_bulk
+    from .sync import record_changes
+    from .timer_cache import forget_active_timer
+    record_bulk([row], [{**row, **changes}])
+    record_changes(row['user_id'], Change.TODO, [self.pk])
+    forget_active_timer(row['user_id'])
+
+    # Only the session of this run of the timer; any other open session was
+    # left by an earlier failure and must not be credited these seconds
+    started_at = row['timer_started_at']
+    closed = TimerSession.objects.filter(todo_id=self.pk, started_at=started_at, stopped_at__isnull=True).update(
+        stopped_at=now, seconds=seconds)
+    if not closed:
+      TimerSession.objects.create(
+          todo_id=self.pk, user_id=row['user_id'], started_at=started_at, stopped_at=now, seconds=seconds)
+
+  def _stopped(self, changes):
+    for field, value in changes.items():
+      setattr(self, field, value)
+    publish_event(self.user_id, 'timer.stopped', timer_state(self))
+
   def get_elapsed_time(self):
     """Get current elapsed time in seconds if timer is active"""
     if self.is_timer_active and self.timer_started_at:
@@ -93,7 +283,25 @@ class Todo(models.Model):
       return cls.objects.get(user=user, is_timer_active=True)
     except cls.DoesNotExist:
       return None
+
+  @classmethod
+  async def aget_active_timer_for_user(cls, user):
+    try:
+      return await cls.objects.aget(user=user, is_timer_active=True)
+    except cls.DoesNotExist:
+      return None
     
+class TaskGroupQuerySet(models.QuerySet):
+  def delete(self):
+    """Delete the groups, recording their tombstones and their ungrouped todos"""
+    from .sync import record_changes
+    with transaction.atomic(using=self.db):
+      for user_id, ids in _by_user(self.values_list('pk', 'user_id')).items():
+        record_changes(user_id, Change.GROUP, ids, deleted=True)
+        record_changes(user_id, Change.TODO, Todo.objects.filter(group_id__in=ids).values_list('pk', flat=True))
+      return super().delete()
+
+
 class TaskGroup(models.Model):
   name = models.CharField(max_length=100)
   description = models.TextField(blank=True, null=True)
@@ -102,9 +310,94 @@ class TaskGroup(models.Model):
   # todos = models.ManyToManyField(Todo, related_name='task_groups', blank=True)
   created_at = models.DateTimeField(auto_now_add=True)
 
+  objects = TaskGroupQuerySet.as_manager()
+
   class Meta:
         unique_together = ['user', 'name']
         ordering = ['name']
 
   def __str__(self):
-    return self.name
\ No newline at end of file
+    return self.name
+
+
+class TimerSession(models.Model):
+  """One start/stop interval of a todo's timer; stopped_at is null while running"""
+  todo = models.ForeignKey(Todo, on_delete=models.CASCADE, related_name='timer_sessions')
+  user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timer_sessions')
+  started_at = models.DateTimeField()
+  stopped_at = models.DateTimeField(null=True, blank=True)
+  seconds = models.IntegerField(null=True, blank=True)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['todo', 'stopped_at'], name='timersession_todo_idx'),
+      models.Index(fields=['user', 'started_at'], name='timersession_user_idx'),
+    ]
+
+  def __str__(self):
+    return f'{self.todo} ({self.started_at:%Y-%m-%d %H:%M:%S})'
+
+
+class TodoCounter(models.Model):
+  """Running todo totals for a user (group is null) or for one of their groups"""
+  user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todo_counters')
+  group = models.ForeignKey(TaskGroup, on_delete=models.CASCADE, null=True, blank=True, related_name='counters')
+
+  total = models.IntegerField(default=0)
+  pending = models.IntegerField(default=0)
+  in_progress = models.IntegerField(default=0)
+  completed = models.IntegerField(default=0)
+  low = models.IntegerField(default=0)
+  medium = models.IntegerField(default=0)
+  high = models.IntegerField(default=0)
+  time_spent = models.BigIntegerField(default=0)
+  duration = models.BigIntegerField(default=0)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=['user'],
+        condition=models.Q(group__isnull=True),
+        name='todocounter_one_per_user',
+      ),
+      models.UniqueConstraint(fields=['user', 'group'], name='todocounter_one_per_group'),
+    ]
+
+  def __str__(self):
+    scope = self.group.name if self.group_id else 'all todos'
+    return f'{self.user} ({scope})'
+
+
+class Change(models.Model):
+  """The latest change to one of a user's todos or groups, for delta sync.
+
+  Each object keeps only its most recent entry, and the auto-incrementing id
+  is the sync sequence: a client that has seen every id up to N asks for the
+  entries after N. Deleted objects keep an entry with ``deleted`` set.
+  """
+  TODO = 'todo'
+  GROUP = 'group'
+  KIND_CHOICES = (
+    (TODO, 'Todo'),
+    (GROUP, 'Group'),
+  )
+
+  # change_user_seq_idx leads with the user, so it serves the foreign key too
+  user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='changes', db_index=False)
+  kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+  object_id = models.BigIntegerField()
+  deleted = models.BooleanField(default=False)
+  changed_at = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    indexes = [
+      # Delta sync reads a user's entries after a cursor as one range scan
+      models.Index(fields=['user', 'id'], name='change_user_seq_idx'),
+    ]
+    constraints = [
+      models.UniqueConstraint(fields=['kind', 'object_id'], name='change_one_per_object'),
+    ]
+
+  def __str__(self):
+    action = 'deleted' if self.deleted else 'changed'
+    return f'{self.kind} {self.object_id} {action} (#{self.pk})'
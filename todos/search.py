@@ -0,0 +1,181 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Todo
+
+SEARCH_TABLE = 'todos_todo_search'
+
+SEARCH_SCHEMA = (
+  f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+  f"title, description, user_id, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+SEARCH_RESULTS = 20
+
+# Up to this many matches are looked up by id; more are left to the todo
+# query, which then finds a page of them early in its own index order
+SPARSE_MATCHES = 1000
+
+# Matches in titles count ten times as much as matches in descriptions, and
+# the owner column, which every query matches, not at all
+RANK = f'bm25({SEARCH_TABLE}, 10.0, 1.0, 0.0)'
+
+TOKEN = re.compile(r'\w+')
+
+# Control characters, which nobody types into a title, mark the matches in
+# a snippet until the text around them has been escaped
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+
+def search_enabled(db=connection):
+  """Whether the database has the FTS5 index; other databases scan with icontains"""
+  return db.vendor == 'sqlite'
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+  """Create and fill the FTS5 table unless it exists, after migrate.
+
+  The table keeps its own copy of each title and description, keyed by the
+  todo id, with the owner indexed as a third column so that a query only
+  matches the todos of one user. Prefixes of two and three characters are
+  indexed as well. A table created with another definition is dropped and
+  built again.
+  """
+  db = connections[using]
+  if not search_enabled(db):
+    return
+  with db.cursor() as cursor:
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [SEARCH_TABLE])
+    row = cursor.fetchone()
+    if row and row[0] == SEARCH_SCHEMA:
+      return
+    if row:
+      cursor.execute(f'DROP TABLE {SEARCH_TABLE}')
+    cursor.execute(SEARCH_SCHEMA)
+  rebuild_search_index(using)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+  """Fill the index from the todos table, replacing whatever it held"""
+  with connections[using].cursor() as cursor:
+    cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    cursor.execute(
+      f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, user_id) "
+      f"SELECT id, title, COALESCE(description, ''), user_id FROM {Todo._meta.db_table}"
+    )
+
+
+def index_todos(todos):
+  """Add or replace the index rows of some saved todos"""
+  if not todos or not search_enabled():
+    return
+  unindex_todos([todo.pk for todo in todos])
+  with connection.cursor() as cursor:
+    cursor.executemany(
+      f'INSERT INTO {SEARCH_TABLE} (rowid, title, description, user_id) VALUES (%s, %s, %s, %s)',
+      [(todo.pk, todo.title, todo.description or '', todo.user_id) for todo in todos],
+    )
+
+
+def unindex_todos(ids):
+  if not ids or not search_enabled():
+    return
+  ids = list(ids)
+  with connection.cursor() as cursor:
+    cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+def unindex_user(user_id):
+  """Drop the index rows of a user's todos, before the todos are deleted"""
+  if not search_enabled():
+    return
+  with connection.cursor() as cursor:
+    cursor.execute(
+      f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM {Todo._meta.db_table} WHERE user_id = %s)',
+      [user_id],
+    )
+
+
+def match_query(text):
+  """An FTS5 query matching todos that contain every word of ``text``.
+
+  Each word is quoted, so punctuation in the search box cannot be read as
+  query syntax, and matches as a prefix. Returns '' if there are no words.
+  """
+  return ' '.join(f'"{token}"*' for token in TOKEN.findall(text))
+
+
+def user_query(user, text):
+  """The match query of ``text`` narrowed to the todos of ``user``.
+
+  The words are only looked up in the title and description, so a number in
+  the search box never matches an owner id. Returns '' if there are no words.
+  """
+  query = match_query(text)
+  if not query:
+    return ''
+  return f'user_id : "{user.pk}" AND {{title description}} : ({query})'
+
+
+def search_filter(todos, user, text):
+  """Restrict a queryset of the user's todos to the rows matching ``text``.
+
+  The matching ids are read from the index straight away, and only among the
+  user's rows, so other users' todos never count towards the limit. A few of
+  them are passed to the todo query as a list, so it fetches them by primary
+  key instead of checking every row of the user against the index.
+  """
+  if not search_enabled():
+    return todos.filter(Q(title__icontains=text) | Q(description__icontains=text))
+  query = user_query(user, text)
+  if not query:
+    return todos.none()
+  matches = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+  with connection.cursor() as cursor:
+    cursor.execute(f'{matches} LIMIT %s', [query, SPARSE_MATCHES + 1])
+    ids = [row[0] for row in cursor.fetchall()]
+  if len(ids) <= SPARSE_MATCHES:
+    return todos.filter(pk__in=ids)
+  return todos.filter(pk__in=RawSQL(matches, [query]))
+
+
+def _highlight(snippet):
+  return mark_safe(escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+def search_todos(user, text, limit=SEARCH_RESULTS):
+  """The user's todos matching ``text``, best first, with highlighted snippets.
+
+  Returns a list of dicts with the todo id, its title, and title and
+  description snippets in which the matched words are wrapped in <mark>.
+  """
+  query = user_query(user, text)
+  if not query:
+    return []
+  if not search_enabled():
+    todos = search_filter(Todo.objects.filter(user=user), user, text).order_by('-created_at', '-id')[:limit]
+    return [
+      {'id': todo.pk, 'title': todo.title, 'title_snippet': escape(todo.title),
+       'description_snippet': escape(todo.description or '')}
+      for todo in todos
+    ]
+
+  with connection.cursor() as cursor:
+    cursor.execute(
+      f"SELECT rowid, title, "
+      f"snippet({SEARCH_TABLE}, 0, %s, %s, '…', 12), "
+      f"snippet({SEARCH_TABLE}, 1, %s, %s, '…', 16) "
+      f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY {RANK} LIMIT %s",
+      [MATCH_START, MATCH_END, MATCH_START, MATCH_END, query, limit],
+    )
+    rows = cursor.fetchall()
+  return [
+    {'id': pk, 'title': title, 'title_snippet': _highlight(title_snippet),
+     'description_snippet': _highlight(description_snippet)}
+    for pk, title, title_snippet, description_snippet in rows
+  ]
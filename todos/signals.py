@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Change, TaskGroup, Todo
+from .search import index_todos, unindex_todos, unindex_user
+from .sync import record_changes
+from .timer_cache import caches_todo, drop_active_timer
+
+
+@receiver(post_save, sender=Todo)
+@receiver(post_delete, sender=Todo)
+def drop_cached_timer(sender, instance, **kwargs):
+  """Drop the cached active timer when its todo is edited or deleted"""
+  if caches_todo(instance.user_id, instance):
+    drop_active_timer(instance.user_id)
+
+
+@receiver(post_save, sender=Todo)
+@receiver(post_save, sender=TaskGroup)
+def record_saved(sender, instance, **kwargs):
+  kind = Change.TODO if sender is Todo else Change.GROUP
+  record_changes(instance.user_id, kind, [instance.pk])
+
+
+@receiver(post_delete, sender=Todo)
+@receiver(post_delete, sender=TaskGroup)
+def record_deleted(sender, instance, origin=None, **kwargs):
+  # Queryset deletes record their tombstones in one batch themselves (see
+  # TodoQuerySet and TaskGroupQuerySet), and nothing is left to sync once
+  # the whole account is being deleted
+  if not isinstance(origin, (Todo, TaskGroup)):
+    return
+  kind = Change.TODO if sender is Todo else Change.GROUP
+  record_changes(instance.user_id, kind, [instance.pk], deleted=True)
+
+
+@receiver(pre_delete, sender=TaskGroup)
+def record_ungrouped(sender, instance, origin=None, **kwargs):
+  # Deleting a group clears the group of its todos without saving them
+  if not isinstance(origin, TaskGroup):
+    return
+  record_changes(instance.user_id, Change.TODO, instance.todos.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Todo)
+def index_saved(sender, instance, update_fields=None, **kwargs):
+  if update_fields is None or {'title', 'description'} & set(update_fields):
+    index_todos([instance])
+
+
+@receiver(post_delete, sender=Todo)
+def unindex_deleted(sender, instance, origin=None, **kwargs):
+  # Queryset deletes unindex their rows in one batch themselves; see TodoQuerySet
+  if isinstance(origin, Todo):
+    unindex_todos([instance.pk])
+
+
+@receiver(pre_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+  unindex_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def reset_new_user_timer(sender, instance, created, **kwargs):
+  # Never serve a new account the timer cached for an earlier account that
+  # had the same id, e.g. on databases that reuse the ids of deleted rows
+  if created:
+    drop_active_timer(instance.pk)
@@ -0,0 +1,30 @@
+// Shared by the todo and group delete pages: the delete button stays
+// disabled until "yes" is typed into the confirmation box. A form with a
+// data-confirm attribute asks once more before it is submitted.
+const confirmInput = document.getElementById('confirm');
+const deleteBtn = document.getElementById('delete-btn');
+const deleteForm = deleteBtn.form;
+
+function confirmed() {
+  return confirmInput.value.toLowerCase() === 'yes';
+}
+
+confirmInput.addEventListener('input', function() {
+  deleteBtn.disabled = !confirmed();
+  deleteBtn.style.opacity = deleteBtn.disabled ? '0.5' : '1';
+  deleteBtn.style.cursor = deleteBtn.disabled ? 'not-allowed' : 'pointer';
+});
+
+// Prevent accidental submission
+deleteForm.addEventListener('submit', function(e) {
+  if (!confirmed()) {
+    e.preventDefault();
+    alert('Please type "yes" to confirm deletion.');
+    return;
+  }
+  if (deleteForm.dataset.confirm && !confirm(deleteForm.dataset.confirm)) {
+    e.preventDefault();
+  }
+});
+
+confirmInput.focus();
@@ -0,0 +1,227 @@
+let timerInterval = null;
+let startTime = null;
+let elapsedSeconds = 0;
+
+const startBtn = document.getElementById('start-timer');
+const stopBtn = document.getElementById('stop-timer');
+const timerDisplay = document.getElementById('timer-display');
+const timerSection = document.getElementById('timer-section');
+const todoId = Number(timerSection.dataset.todoId);
+
+function formatTime(seconds) {
+  const hours = Math.floor(seconds / 3600);
+  const minutes = Math.floor((seconds % 3600) / 60);
+  const secs = seconds % 60;
+  return `${String(hours).padStart(2, '0')}:${String(minutes).padStart(2, '0')}:${String(secs).padStart(2, '0')}`;
+}
+
+function updateDisplay() {
+  const currentSeconds = elapsedSeconds + Math.floor((Date.now() - startTime) / 1000);
+  timerDisplay.textContent = formatTime(currentSeconds);
+}
+
+function getCookie(name) {
+  let cookieValue = null;
+  if (document.cookie && document.cookie !== '') {
+    const cookies = document.cookie.split(';');
+    for (let i = 0; i < cookies.length; i++) {
+      const cookie = cookies[i].trim();
+      if (cookie.substring(0, name.length + 1) === (name + '=')) {
+        cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+        break;
+      }
+    }
+  }
+  return cookieValue;
+}
+
+// The user's active timer as last pushed by the event stream, when the
+// page follows one
+let timerEvents = null;
+let activeTimer = null;
+
+function showRunning(seconds) {
+  clearInterval(timerInterval);
+  elapsedSeconds = seconds;
+  startTime = Date.now();
+  timerInterval = setInterval(updateDisplay, 1000);
+  startBtn.style.display = 'none';
+  stopBtn.style.display = 'block';
+  updateDisplay();
+}
+
+function showStopped(data) {
+  clearInterval(timerInterval);
+  timerInterval = null;
+  elapsedSeconds = 0;
+  timerDisplay.textContent = '00:00:00';
+  startBtn.style.display = 'block';
+  stopBtn.style.display = 'none';
+
+  const timeSpentElement = document.getElementById('time-spent');
+  const timeRemainingElement = document.getElementById('time-remaining');
+  if (timeSpentElement) {
+    timeSpentElement.textContent = `${data.time_spent || 0} min`;
+  }
+  if (timeRemainingElement) {
+    timeRemainingElement.textContent = `${data.time_remaining || 0} min`;
+  }
+}
+
+async function checkForActiveTimer() {
+  if (timerEvents === null) {
+    try {
+      const response = await fetch('/todos/timer/check-active/');
+      const data = await response.json();
+      if (data.has_active_timer && data.active_todo_id !== todoId) {
+        return {
+          hasActive: true,
+          todoId: data.active_todo_id,
+          todoTitle: data.active_todo_title
+        };
+      }
+    } catch (error) {
+      console.error('Error checking active timer:', error);
+    }
+    return { hasActive: false };
+  }
+  if (activeTimer === null) {
+    return { hasActive: false };
+  }
+  if (activeTimer.todo_id !== todoId) {
+    return {
+      hasActive: true,
+      todoId: activeTimer.todo_id,
+      todoTitle: activeTimer.title
+    };
+  }
+  return { hasActive: false };
+}
+
+startBtn.addEventListener('click', async () => {
+  try {
+    // Check if another timer is active
+    const activeCheck = await checkForActiveTimer();
+    
+    if (activeCheck.hasActive) {
+      const confirmSwitch = confirm(
+        `You have an active timer running on "${activeCheck.todoTitle}". \n\n` +
+        `Starting this timer will pause the other task and set it to "Pending". \n\n` +
+        `Do you want to continue?`
+      );
+      
+      if (!confirmSwitch) {
+        return;
+      }
+    }
+    
+    const response = await fetch(`/todos/${todoId}/timer/start/`, {
+      method: 'POST',
+      headers: {
+        'X-CSRFToken': getCookie('csrftoken'),
+        'Content-Type': 'application/json'
+      }
+    });
+    
+    if (response.ok) {
+      showRunning(0);
+    }
+  } catch (error) {
+    console.error('Error starting timer:', error);
+    alert('Failed to start timer. Please try again.');
+  }
+});
+
+stopBtn.addEventListener('click', async () => {
+  try {
+    const response = await fetch(`/todos/${todoId}/timer/stop/`, {
+      method: 'POST',
+      headers: {
+        'X-CSRFToken': getCookie('csrftoken'),
+        'Content-Type': 'application/json'
+      }
+    });
+    
+    if (response.ok) {
+      showStopped(await response.json());
+    } else {
+      const errorData = await response.json().catch(() => ({}));
+      console.error('Stop timer failed:', errorData);
+      alert('Failed to stop timer. Please try again.');
+    }
+  } catch (error) {
+    console.error('Error stopping timer:', error);
+    alert('Failed to stop timer. Please try again.');
+  }
+});
+
+// The page is rendered with the timer's state. The status endpoint then
+// confirms it, since the browser may show a cached copy of the page.
+if (timerSection.dataset.timerActive === 'true') {
+  showRunning(Number(timerSection.dataset.elapsedSeconds));
+}
+
+async function checkTimerStatus() {
+  try {
+    const response = await fetch(`/todos/${todoId}/timer/status/`);
+    const data = await response.json();
+    if (data.is_active) {
+      showRunning(data.elapsed_seconds);
+    } else if (timerInterval !== null) {
+      showStopped(data);
+    }
+  } catch (error) {
+    console.error('Error checking timer status:', error);
+  }
+}
+
+// Also fires when the page is restored from the back-forward cache
+window.addEventListener('pageshow', checkTimerStatus);
+
+// Under ASGI, timer changes are pushed by the server, including ones made
+// in other tabs. The page has no stream URL otherwise.
+if (timerSection.dataset.eventsUrl) {
+  followTimerEvents(timerSection.dataset.eventsUrl);
+}
+
+function followTimerEvents(url) {
+  timerEvents = new EventSource(url);
+
+  timerEvents.addEventListener('timer.state', (event) => {
+    const data = JSON.parse(event.data);
+    activeTimer = data.has_active_timer ? data : null;
+    if (activeTimer && activeTimer.todo_id === todoId) {
+      showRunning(activeTimer.elapsed_seconds);
+    }
+  });
+
+  timerEvents.addEventListener('timer.started', (event) => {
+    const data = JSON.parse(event.data);
+    activeTimer = data;
+    if (data.todo_id === todoId) {
+      showRunning(data.elapsed_seconds);
+    }
+  });
+
+  timerEvents.addEventListener('timer.stopped', (event) => {
+    const data = JSON.parse(event.data);
+    if (activeTimer && activeTimer.todo_id === data.todo_id) {
+      activeTimer = null;
+    }
+    if (data.todo_id === todoId) {
+      showStopped(data);
+    }
+  });
+
+  timerEvents.addEventListener('todo.status', (event) => {
+    const data = JSON.parse(event.data);
+    if (data.todo_id === todoId) {
+      const statusElement = document.getElementById('todo-status');
+      if (statusElement) {
+        statusElement.textContent = data.status;
+      }
+    }
+  });
+
+  window.addEventListener('beforeunload', () => timerEvents.close());
+}
@@ -0,0 +1,49 @@
+// Filtering, searching and sorting happen on the server: submit the
+// filter form whenever one of the dropdowns changes.
+const filterForm = document.getElementById('todo-filters');
+filterForm.querySelectorAll('select').forEach(select => {
+  select.addEventListener('change', () => filterForm.submit());
+});
+
+// Show the best matches while typing; Enter still filters the whole list.
+// Snippets come escaped from the server, with the matches in <mark>.
+const searchInput = document.getElementById('search-input');
+const searchResults = document.getElementById('search-results');
+let searchTimeout = null;
+let searchController = null;
+
+searchInput.addEventListener('input', () => {
+  clearTimeout(searchTimeout);
+  searchTimeout = setTimeout(async () => {
+    const query = searchInput.value.trim();
+    if (searchController) {
+      searchController.abort();
+    }
+    if (!query) {
+      searchResults.hidden = true;
+      return;
+    }
+    searchController = new AbortController();
+    try {
+      const response = await fetch(`${searchInput.dataset.searchUrl}?q=${encodeURIComponent(query)}`, {
+        signal: searchController.signal,
+      });
+      const data = await response.json();
+      searchResults.innerHTML = data.results.map(result => `
+        <li><a href="${result.url}">
+          <strong>${result.title_snippet}</strong>
+          ${result.description_snippet ? `<span>${result.description_snippet}</span>` : ''}
+        </a></li>`).join('');
+      searchResults.hidden = data.results.length === 0;
+    } catch (error) {
+      if (error.name !== 'AbortError') {
+        console.error('Search failed:', error);
+      }
+    }
+  }, 200);
+});
+
+searchInput.addEventListener('blur', () => {
+  // Let a click on a result land before the list is hidden
+  setTimeout(() => { searchResults.hidden = true; }, 200);
+});
@@ -0,0 +1,68 @@
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .counters import get_group_counters, get_user_counters
+from .models import TimerSession, Todo
+
+
+def get_due_counts(todos, today):
+  """Count open todos that are overdue or due today.
+
+  Only rows due on or before ``today`` are read, through the due_date index.
+  """
+  return todos.filter(due_date__lte=today).exclude(status='Completed').aggregate(
+    overdue=Count('id', filter=Q(due_date__lt=today)),
+    due_today=Count('id', filter=Q(due_date=today)),
+  )
+
+
+def get_todo_stats(user, group=None, today=None):
+  """Summarize a user's todos, or one of their groups.
+
+  Returns a dict with ``total``, one key per status (``pending``,
+  ``in_progress``, ``completed``), one key per priority (``low``, ``medium``,
+  ``high``), the summed ``time_spent`` and ``duration``, and the ``overdue``
+  and ``due_today`` counts. Completed todos are never counted as overdue or
+  due today. Everything but the due counts is read from the TodoCounter row.
+  """
+  today = today or timezone.now().date()
+  todos = Todo.objects.filter(user=user)
+  if group is not None:
+    todos = todos.filter(group=group)
+    stats = get_group_counters(user, [group.pk])[group.pk]
+  else:
+    stats = get_user_counters(user)
+  return {**stats, **get_due_counts(todos, today)}
+
+
+def get_group_stats(user, groups, today=None):
+  """Stats for several of a user's groups, keyed by group id"""
+  today = today or timezone.now().date()
+  group_ids = [group.pk for group in groups]
+  if not group_ids:
+    return {}
+  stats = get_group_counters(user, group_ids)
+  due_rows = (
+    Todo.objects.filter(user=user, group_id__in=group_ids, due_date__lte=today)
+    .exclude(status='Completed')
+    .values('group_id')
+    .annotate(overdue=Count('id', filter=Q(due_date__lt=today)), due_today=Count('id', filter=Q(due_date=today)))
+    .order_by()
+  )
+  due_counts = {row.pop('group_id'): row for row in due_rows}
+  return {
+    group_id: {**values, **due_counts.get(group_id, {'overdue': 0, 'due_today': 0})}
+    for group_id, values in stats.items()
+  }
+
+
+def get_tracked_seconds(user, start=None, end=None, group=None):
+  """Sum the finished timer sessions a user started in [start, end)"""
+  sessions = TimerSession.objects.filter(user=user, seconds__isnull=False)
+  if start is not None:
+    sessions = sessions.filter(started_at__gte=start)
+  if end is not None:
+    sessions = sessions.filter(started_at__lt=end)
+  if group is not None:
+    sessions = sessions.filter(todo__group=group)
+  return sessions.aggregate(total=Sum('seconds'))['total'] or 0
@@ -0,0 +1,85 @@
+from django.db.models import Max
+
+from .models import Change, TaskGroup, Todo
+
+SYNC_PAGE_SIZE = 500
+
+TODO_SYNC_FIELDS = (
+  'id', 'title', 'description', 'priority', 'status', 'due_date', 'duration',
+  'time_spent', 'time_remaining', 'time_completion', 'tracked_seconds',
+  'is_timer_active', 'timer_started_at', 'group_id', 'created_at', 'updated_at',
+)
+GROUP_SYNC_FIELDS = ('id', 'name', 'description', 'color', 'created_at')
+
+
+def record_changes(user_id, kind, ids, deleted=False):
+  """Move the sync entries of some todos or groups to the end of the sequence.
+
+  Call this inside the transaction that writes the objects. Earlier entries
+  for the same objects are replaced, so the table holds one row per object.
+  """
+  ids = list(dict.fromkeys(ids))
+  if not ids:
+    return
+  Change.objects.filter(kind=kind, object_id__in=ids).delete()
+  Change.objects.bulk_create([
+    Change(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted) for object_id in ids
+  ])
+
+
+def current_cursor(user):
+  return Change.objects.filter(user=user).aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def snapshot(user):
+  """Every todo and group of a user, with the cursor to sync from afterwards"""
+  # Read the cursor first: anything written while the snapshot is read comes
+  # again in the next delta
+  cursor = current_cursor(user)
+  return {
+    'todos': list(Todo.objects.filter(user=user).order_by('id').values(*TODO_SYNC_FIELDS)),
+    'groups': list(TaskGroup.objects.filter(user=user).order_by('id').values(*GROUP_SYNC_FIELDS)),
+    'deleted': {'todos': [], 'groups': []},
+    'cursor': cursor,
+    'has_more': False,
+  }
+
+
+def _rows(model, user, ids, fields):
+  if not ids:
+    return []
+  return list(model.objects.filter(user=user, id__in=ids).order_by('id').values(*fields))
+
+
+def delta(user, cursor, limit=SYNC_PAGE_SIZE):
+  """The todos and groups changed or deleted after ``cursor``.
+
+  An idle poll costs one range scan of the (user, id) index that returns no
+  rows. Otherwise the changed todos and groups are read with one query each.
+  Entries are committed in id order on SQLite, where writes are serialized.
+  """
+  changes = list(
+    Change.objects.filter(user=user, id__gt=cursor).order_by('id').values_list('id', 'kind', 'object_id', 'deleted')[:limit + 1]
+  )
+  has_more = len(changes) > limit
+  changes = changes[:limit]
+
+  changed = {Change.TODO: [], Change.GROUP: []}
+  deleted = {Change.TODO: [], Change.GROUP: []}
+  for _id, kind, object_id, is_deleted in changes:
+    (deleted if is_deleted else changed)[kind].append(object_id)
+
+  todos = _rows(Todo, user, changed[Change.TODO], TODO_SYNC_FIELDS)
+  groups = _rows(TaskGroup, user, changed[Change.GROUP], GROUP_SYNC_FIELDS)
+
+  # An object deleted after its change was read is reported as deleted
+  deleted[Change.TODO] += sorted(set(changed[Change.TODO]) - {todo['id'] for todo in todos})
+  deleted[Change.GROUP] += sorted(set(changed[Change.GROUP]) - {group['id'] for group in groups})
+
+  return {
+    'todos': todos,
+    'groups': groups,
+    'deleted': {'todos': deleted[Change.TODO], 'groups': deleted[Change.GROUP]},
+    'cursor': changes[-1][0] if changes else cursor,
+    'has_more': has_more,
+  }
@@ -0,0 +1,173 @@
+"""The id, title and start of each user's running timer, cached.
+
+Every worker must see a timer start or stop as soon as it commits, so the
+entries are only kept when the fragment cache is shared between processes.
+With the default local-memory cache every lookup reads the database.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from advanced_todo_list.caches import shared_cache
+
+from .models import Todo
+
+# Bounds how long an entry can stay wrong if a process dies between a commit
+# and its write-through
+ACTIVE_TIMER_TIMEOUT = 600
+
+# Cached for users without a running timer, since None means a cache miss
+NO_TIMER = 0
+
+STATS = ('hits', 'misses')
+
+
+class ActiveTimer(namedtuple('ActiveTimer', ['id', 'title', 'started_at'])):
+  """The cached fields of a user's running timer"""
+  def get_elapsed_time(self):
+    return max(int((timezone.now() - self.started_at).total_seconds()), 0)
+
+
+def timer_cache():
+  """The fragment cache when it is shared between processes, otherwise None"""
+  return shared_cache(settings.TODO_FRAGMENT_CACHE)
+
+
+def _key(user_id):
+  return f'active-timer:{user_id}'
+
+
+def _stat_key(name):
+  return f'active-timer-stats:{name}'
+
+
+def _count(cache, name):
+  # Counted in the cache itself, which is shared, so the hit rate covers every worker
+  try:
+    cache.incr(_stat_key(name))
+  except ValueError:
+    if not cache.add(_stat_key(name), 1, timeout=None):
+      cache.incr(_stat_key(name))
+
+
+async def _acount(cache, name):
+  try:
+    await cache.aincr(_stat_key(name))
+  except ValueError:
+    if not await cache.aadd(_stat_key(name), 1, timeout=None):
+      await cache.aincr(_stat_key(name))
+
+
+def _entry(todo):
+  return (todo.id, todo.title, todo.timer_started_at) if todo else NO_TIMER
+
+
+def _timer(entry):
+  return ActiveTimer(*entry) if entry else None
+
+
+def _active_todos(user_id):
+  # Unordered: the partial unique index allows one row, which first() would sort
+  return Todo.objects.filter(user_id=user_id, is_timer_active=True).only('title', 'timer_started_at')[:1]
+
+
+def active_timer(user_id):
+  """The user's running timer, or None, read through the cache.
+
+  A miss rebuilds the entry with the indexed active-timer lookup. The entry
+  is stored with add(), so a timer started or stopped meanwhile, which
+  writes its own entry, is never overwritten with what the miss read.
+  """
+  cache = timer_cache()
+  if cache is not None:
+    entry = cache.get(_key(user_id))
+    if entry is not None:
+      _count(cache, 'hits')
+      return _timer(entry)
+    _count(cache, 'misses')
+  todos = list(_active_todos(user_id))
+  entry = _entry(todos[0] if todos else None)
+  if cache is not None:
+    cache.add(_key(user_id), entry, timeout=ACTIVE_TIMER_TIMEOUT)
+  return _timer(entry)
+
+
+async def aactive_timer(user_id):
+  cache = timer_cache()
+  if cache is not None:
+    entry = await cache.aget(_key(user_id))
+    if entry is not None:
+      await _acount(cache, 'hits')
+      return _timer(entry)
+    await _acount(cache, 'misses')
+  todos = [todo async for todo in _active_todos(user_id)]
+  entry = _entry(todos[0] if todos else None)
+  if cache is not None:
+    await cache.aadd(_key(user_id), entry, timeout=ACTIVE_TIMER_TIMEOUT)
+  return _timer(entry)
+
+
+def _write_through(user_id, entry):
+  """Store a new entry once the transaction that set it commits.
+
+  Until then the entry is dropped, so readers rebuild it from the database
+  and a rolled back change leaves nothing wrong in the cache.
+  """
+  cache = timer_cache()
+  if cache is None:
+    return
+  cache.delete(_key(user_id))
+  if connection.in_atomic_block:
+    transaction.on_commit(lambda: cache.set(_key(user_id), entry, timeout=ACTIVE_TIMER_TIMEOUT))
+  else:
+    cache.set(_key(user_id), entry, timeout=ACTIVE_TIMER_TIMEOUT)
+
+
+def remember_active_timer(todo):
+  """Write through a timer that was just started"""
+  _write_through(todo.user_id, _entry(todo))
+
+
+def forget_active_timer(user_id):
+  """Write through a timer that was just stopped"""
+  _write_through(user_id, NO_TIMER)
+
+
+def drop_active_timer(user_id):
+  """Drop the entry when a todo changed in a way the timer writes do not cover"""
+  cache = timer_cache()
+  if cache is None:
+    return
+  cache.delete(_key(user_id))
+  if connection.in_atomic_block:
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def caches_todo(user_id, todo):
+  """Whether the cached entry, if any, may be affected by a save or delete of todo"""
+  cache = timer_cache()
+  entry = cache.get(_key(user_id)) if cache is not None else None
+  if entry is None:
+    return False
+  return todo.is_timer_active or bool(entry) and entry[0] == todo.pk
+
+
+def timer_cache_stats():
+  """Hits, misses and hit rate of active-timer lookups since the last reset.
+
+  Only counted while the cache is in use, that is when it is shared.
+  """
+  cache = timer_cache()
+  values = cache.get_many([_stat_key(name) for name in STATS]) if cache is not None else {}
+  stats = {name: values.get(_stat_key(name), 0) for name in STATS}
+  lookups = stats['hits'] + stats['misses']
+  stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+  return stats
+
+
+def reset_timer_cache_stats():
+  cache = timer_cache()
+  if cache is not None:
+    cache.delete_many([_stat_key(name) for name in STATS])
@@ -9,12 +9,24 @@ urlpatterns = [
   path('<int:pk>/', views.detail, name='detail'),
   path('<int:pk>/update/', views.update, name='update'),
   path('<int:pk>/delete/', views.delete, name='delete'),
+  path('bulk/', views.bulk, name='bulk'),
+  path('export/', views.export, name='export'),
+  path('import/', views.import_todos, name='import'),
+  path('search/', views.search, name='search'),
+  path('sync/', views.sync, name='sync'),
 
   # Timer endpoints
   path('<int:pk>/timer/start/', views.start_timer, name='start_timer'),
   path('<int:pk>/timer/stop/', views.stop_timer, name='stop_timer'),
   path('<int:pk>/timer/status/', views.get_timer_status, name='timer_status'),
   path('timer/check-active/', views.check_active_timer, name='check_active_timer'),
+  path('timer/events/', views.timer_events, name='timer_events'),
+
+  # Async timer endpoints, for deployments served over ASGI
+  path('<int:pk>/timer/start/async/', views.astart_timer, name='astart_timer'),
+  path('<int:pk>/timer/stop/async/', views.astop_timer, name='astop_timer'),
+  path('<int:pk>/timer/status/async/', views.aget_timer_status, name='atimer_status'),
+  path('timer/check-active/async/', views.acheck_active_timer, name='acheck_active_timer'),
 
   # Group endpoints
   path('groups/', views.groups_list, name='groups_list'),
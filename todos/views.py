@@ -1,41 +1,124 @@
+import json
+
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST, require_http_methods
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.http import Http404, HttpResponseForbidden, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, etag, require_POST, require_http_methods
 
+from .bulk import BulkError, BulkOperation
+from .conditional import page_etag, page_last_modified, timer_status_etag
+from .export import EXPORT_COLUMNS, EXPORT_FORMATS, export_lines
+from .importer import IMPORT_FORMATS, TodoImporter, guess_format, read_rows, text_stream
+from .events import format_sse, get_broker, timer_state
+from .fragments import cached_page, render_cards
 from .forms import NewTodoForm, UpdateTodoForm, TaskGroupForm
+from .listing import filter_todos, get_sort, paginate_todos
+from .stats import get_group_stats, get_todo_stats
+from .search import SEARCH_RESULTS, search_todos
+from .sync import SYNC_PAGE_SIZE, delta, snapshot
+from .timer_cache import aactive_timer, active_timer
 from .models import Todo, TaskGroup
 
 from django.utils import timezone
 
 @login_required
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def index(request):
-  todos = Todo.objects.filter(user=request.user).order_by('-created_at')
-  # Filter by group if specified
-  group_filter = request.GET.get('group')
-  if group_filter:
-    if group_filter == 'none':
-      todos = todos.filter(group__isnull=True)
-    else:
-      todos = todos.filter(group_id=group_filter)
-  
-  todos = todos.order_by('-created_at')
+  sort = get_sort(request.GET)
+  today = timezone.now().date()
+
+  def build_page():
+    todos = filter_todos(request.user, request.GET)
+    page, next_cursor = paginate_todos(todos, sort, request.GET.get('cursor'))
+    return render_cards(page, today), next_cursor
+
+  cards, next_cursor = cached_page(request, today, build_page)
+
+  next_query = None
+  if next_cursor:
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    next_query = params.urlencode()
+
+  params = request.GET.copy()
+  params.pop('cursor', None)
+  filter_query = params.urlencode()
+  first_query = filter_query if request.GET.get('cursor') else None
 
   # Get all groups for filter dropdown
   groups = TaskGroup.objects.filter(user=request.user)
 
   return render(request, 'todos/index.html', {
-      'todos': todos,
+      'cards': cards,
       'groups': groups,
+      'stats': get_todo_stats(request.user, today=today),
       'current_path': request.path,
-      'today': timezone.now().date(),
-      'selected_group': group_filter
+      'today': today,
+      'selected_group': request.GET.get('group'),
+      'search_query': request.GET.get('q', ''),
+      'selected_status': request.GET.get('status', 'all'),
+      'selected_priority': request.GET.get('priority', 'all'),
+      'selected_sort': sort,
+      'next_query': next_query,
+      'first_query': first_query,
+      'filter_query': filter_query,
   })
 
 @login_required
+@require_http_methods(["GET"])
+def export(request):
+  """Stream the user's todos, or groups, as CSV or JSON Lines.
+
+  Todos take the same filters and sort as the index page.
+  """
+  kind = request.GET.get('kind', 'todos')
+  export_format = request.GET.get('format', 'csv')
+  if kind not in EXPORT_COLUMNS or export_format not in EXPORT_FORMATS:
+    return HttpResponse('Unknown export kind or format.', status=400)
+
+  content_type, extension = EXPORT_FORMATS[export_format]
+  response = StreamingHttpResponse(
+      export_lines(request.user, kind, export_format, request.GET),
+      content_type=f'{content_type}; charset=utf-8',
+  )
+  response['Content-Disposition'] = f'attachment; filename="{kind}.{extension}"'
+  return response
+
+@login_required
+@require_POST
+def import_todos(request):
+  """Import todos from an uploaded CSV or JSON Lines file.
+
+  The file is read row by row and inserted in batches. The response streams
+  JSON Lines: an ``error`` line for each invalid row, a ``progress`` line
+  after each batch and a final ``done`` line with the totals.
+  """
+  upload = request.FILES.get('file')
+  if upload is None:
+    return JsonResponse({'errors': {'file': ['This field is required.']}}, status=400)
+  import_format = request.POST.get('format') or guess_format(upload.name)
+  if import_format not in IMPORT_FORMATS:
+    return JsonResponse({'errors': {'format': [f'Choose one of: {", ".join(IMPORT_FORMATS)}.']}}, status=400)
+
+  events = TodoImporter(request.user).run(read_rows(text_stream(upload.file), import_format))
+  return StreamingHttpResponse(
+      (json.dumps(event) + '\n' for event in events),
+      content_type='application/x-ndjson',
+  )
+
+@login_required
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def detail(request, pk):
   todo = Todo.objects.get(pk=pk)
-  return render(request, 'todos/detail.html', {'todo': todo})
+  return render(request, 'todos/detail.html', {
+      'todo': todo,
+      'elapsed_seconds': todo.get_elapsed_time(),
+      # A worker thread cannot wait on an event stream, so under WSGI the
+      # page keeps to the timer endpoints
+      'events_url': reverse('todos:timer_events') if isinstance(request, ASGIRequest) else None,
+  })
 
 @login_required
 def new(request):
@@ -81,11 +164,59 @@ def delete(request,pk):
 
 @login_required
 @require_POST
-def start_timer(request, pk):
-  """Start timer for a specific todo"""
-  todo = get_object_or_404(Todo, pk=pk, user=request.user)
-  todo.start_timer()
+def bulk(request):
+  """Create, update, move and delete many todos from one JSON batch.
+
+  The body may contain ``create`` (a list of todo objects), ``update`` (a list
+  of objects with an ``id`` and the fields to change), ``move`` (an object with
+  ``ids`` and a ``group`` id or null) and ``delete`` (a list of ids). Either the
+  whole batch is applied or nothing is, and the errors are returned per row.
+  """
+  try:
+    payload = json.loads(request.body)
+  except ValueError:
+    return JsonResponse({'errors': {'__all__': ['Invalid JSON.']}}, status=400)
+  try:
+    result = BulkOperation(request.user, payload).apply()
+  except BulkError as error:
+    return JsonResponse({'errors': error.errors}, status=400)
+  return JsonResponse(result)
 
+@login_required
+@require_http_methods(["GET"])
+def search(request):
+  """The user's todos matching ``q``, best first, with highlighted snippets.
+
+  Every word of the query matches as a prefix of a word in the title or
+  description, and title matches rank higher.
+  """
+  limit = request.GET.get('limit', '')
+  limit = min(int(limit), SEARCH_RESULTS) if limit.isdigit() else SEARCH_RESULTS
+  results = search_todos(request.user, request.GET.get('q', ''), max(limit, 1))
+  for result in results:
+    result['url'] = reverse('todos:detail', args=[result['id']])
+  return JsonResponse({'results': results})
+
+@login_required
+@require_http_methods(["GET"])
+def sync(request):
+  """Changes to the user's todos and groups since a sync cursor.
+
+  Without a ``cursor`` every todo and group is returned. With one, only the
+  todos and groups changed after it are returned, plus the ids of deleted
+  ones. Either way the response carries the cursor to send next time, and
+  ``has_more`` while further changes are waiting.
+  """
+  cursor = request.GET.get('cursor')
+  if cursor is None:
+    return JsonResponse(snapshot(request.user))
+  limit = request.GET.get('limit', '')
+  if not cursor.isdigit() or (limit and not limit.isdigit()):
+    return JsonResponse({'errors': {'cursor': ['Enter a valid cursor and limit.']}}, status=400)
+  limit = min(int(limit), SYNC_PAGE_SIZE) if limit else SYNC_PAGE_SIZE
+  return JsonResponse(delta(request.user, int(cursor), max(limit, 1)))
+
+def _timer_started(todo):
   return JsonResponse({
         'status': 'success',
         'message': 'Timer started',
@@ -93,13 +224,7 @@ def start_timer(request, pk):
         'todo_id': todo.id
     })
 
-@login_required
-@require_POST
-def stop_timer(request, pk):
-  """Stop timer for a specific todo"""
-  todo = get_object_or_404(Todo, pk=pk, user=request.user)
-  todo.stop_timer()
-  
+def _timer_stopped(todo):
   return JsonResponse({
       'status': 'success',
       'message': 'Timer stopped',
@@ -108,12 +233,13 @@ def stop_timer(request, pk):
       'time_completion': todo.time_completion or 0
   })
 
-@login_required
-@require_http_methods(["GET"])
-def get_timer_status(request, pk):
-  """Get current timer status for a todo"""
-  todo = get_object_or_404(Todo, pk=pk, user=request.user)
-    
+def _timer_not_stopped():
+  return JsonResponse({
+      'status': 'error',
+      'message': 'The timer was restarted meanwhile and is still running',
+  }, status=409)
+
+def _timer_status(todo):
   return JsonResponse({
       'is_active': todo.is_timer_active,
       'elapsed_seconds': todo.get_elapsed_time(),
@@ -123,12 +249,7 @@ def get_timer_status(request, pk):
       'status': todo.status
   })
 
-@login_required
-@require_http_methods(["GET"])
-def check_active_timer(request):
-  """Check if user has any active timer"""
-  active_todo = Todo.get_active_timer_for_user(request.user)
-    
+def _active_timer(active_todo):
   if active_todo:
     return JsonResponse({
         'has_active_timer': True,
@@ -143,9 +264,128 @@ def check_active_timer(request):
         'active_todo_title': None
     })
 
+async def _aget_todo_or_404(request, pk):
+  user = await request.auser()
+  try:
+    return await Todo.objects.aget(pk=pk, user=user)
+  except Todo.DoesNotExist:
+    raise Http404('No Todo matches the given query.')
+
+@login_required
+@require_POST
+def start_timer(request, pk):
+  """Start timer for a specific todo"""
+  todo = get_object_or_404(Todo, pk=pk, user=request.user)
+  todo.start_timer()
+  return _timer_started(todo)
+
+@login_required
+@require_POST
+def stop_timer(request, pk):
+  """Stop timer for a specific todo"""
+  todo = get_object_or_404(Todo, pk=pk, user=request.user)
+  if not todo.stop_timer():
+    return _timer_not_stopped()
+  return _timer_stopped(todo)
+
+@login_required
+@require_http_methods(["GET"])
+@etag(timer_status_etag)
+def get_timer_status(request, pk):
+  """Get current timer status for a todo"""
+  todo = get_object_or_404(Todo, pk=pk, user=request.user)
+  return _timer_status(todo)
+
+@login_required
+@require_http_methods(["GET"])
+def check_active_timer(request):
+  """Check if user has any active timer"""
+  return _active_timer(active_timer(request.user.pk))
+
+# Async variants of the timer endpoints. Under ASGI they read the session,
+# the user and the todo without holding a worker thread; only the start and
+# stop transactions still run on the sync executor.
+
+@login_required
+@require_POST
+async def astart_timer(request, pk):
+  todo = await _aget_todo_or_404(request, pk)
+  await todo.astart_timer()
+  return _timer_started(todo)
+
+@login_required
+@require_POST
+async def astop_timer(request, pk):
+  todo = await _aget_todo_or_404(request, pk)
+  if not await todo.astop_timer():
+    return _timer_not_stopped()
+  return _timer_stopped(todo)
+
+@login_required
+@require_http_methods(["GET"])
+async def aget_timer_status(request, pk):
+  return _timer_status(await _aget_todo_or_404(request, pk))
+
+@login_required
+@require_http_methods(["GET"])
+async def acheck_active_timer(request):
+  user = await request.auser()
+  return _active_timer(await aactive_timer(user.pk))
+
+# Seconds between keep-alive comments on an idle event stream
+EVENT_STREAM_HEARTBEAT = 15
+
+# Milliseconds a browser waits before reconnecting to a stream that ended
+EVENT_STREAM_RETRY = 30000
+
+@login_required
+@require_http_methods(["GET"])
+async def timer_events(request):
+  """Stream the user's timer starts, stops and status changes as Server-Sent Events.
+
+  Serve this under ASGI: each open tab then waits on a queue instead of
+  holding a worker thread or polling the timer endpoints. Under WSGI the
+  whole response is built before it is sent, so the stream only carries
+  the current state and ends.
+  """
+  user = await request.auser()
+  endless = isinstance(request, ASGIRequest)
+
+  async def stream():
+    # Subscribe before reading the current state so no change is missed
+    subscription = get_broker().subscribe(user.pk)
+    try:
+      # Most users have no running timer, which the cache answers without a query
+      timer = await aactive_timer(user.pk)
+      active_todo = None
+      if timer:
+        active_todo = await Todo.objects.filter(pk=timer.id, is_timer_active=True).afirst()
+      yield format_sse({
+          'type': 'timer.state',
+          'has_active_timer': active_todo is not None,
+          **(timer_state(active_todo) if active_todo else {}),
+      })
+      if not endless:
+        yield f'retry: {EVENT_STREAM_RETRY}\n\n'
+        return
+      while True:
+        event = await subscription.get(timeout=EVENT_STREAM_HEARTBEAT)
+        yield format_sse(event) if event else ': keep-alive\n\n'
+    finally:
+      subscription.close()
+
+  response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+  response['Cache-Control'] = 'no-cache'
+  response['X-Accel-Buffering'] = 'no'
+  return response
+
 @login_required
 def groups_list(request):
-  groups = TaskGroup.objects.filter(user=request.user)
+  groups = list(TaskGroup.objects.filter(user=request.user))
+  # Read every group's counters in one query instead of counting per group
+  group_stats = get_group_stats(request.user, groups)
+  for group in groups:
+    group.stats = group_stats[group.pk]
   return render(request, 'todos/groups_list.html', {'groups': groups})
 
 
@@ -165,10 +405,15 @@ def create_group(request):
   return render(request, 'todos/create_group.html', {'form': form})
 
 @login_required
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def group_detail(request, pk):
   group = get_object_or_404(TaskGroup, pk=pk, user=request.user)
   todos = group.todos.filter(user=request.user).order_by('-created_at')
-  return render(request, 'todos/group_detail.html', {'group': group, 'todos': todos})
+  return render(request, 'todos/group_detail.html', {
+      'group': group,
+      'todos': todos,
+      'stats': get_todo_stats(request.user, group=group),
+  })
 
 @login_required
 def update_group(request, pk):
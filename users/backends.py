@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import transaction
+
+from advanced_todo_list.caches import shared_cache
+
+
+def user_key(user_id):
+  return f'auth-user:{user_id}'
+
+
+def user_cache():
+  """The cache for logged-in users, or None when it is not shared between workers"""
+  return shared_cache(settings.AUTH_USER_CACHE)
+
+
+def forget_user(user_id):
+  """Drop a cached user, after a save, a password change, a logout or a delete.
+
+  The entry is dropped again once the transaction commits, in case another
+  request cached the old row in between.
+  """
+  cache = user_cache()
+  if cache is not None:
+    cache.delete(user_key(user_id))
+    transaction.on_commit(lambda: cache.delete(user_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+  """The model backend, keeping the user of each session in a cache for a short while.
+
+  AuthenticationMiddleware already loads the user once per request. This
+  saves that query on most requests too. The entry is dropped whenever the
+  user is saved, including password changes and the last_login update, and
+  on logout. Django still compares the session's password hash with the
+  cached user's, so an entry can never outlive a password change by more
+  than the time it takes to drop it.
+  """
+  def get_user(self, user_id):
+    cache = user_cache()
+    if cache is None:
+      return super().get_user(user_id)
+    user = cache.get(user_key(user_id))
+    if user is None:
+      user = super().get_user(user_id)
+      if user is not None:
+        cache.set(user_key(user_id), user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+  async def aget_user(self, user_id):
+    cache = user_cache()
+    if cache is None:
+      return await super().aget_user(user_id)
+    user = await cache.aget(user_key(user_id))
+    if user is None:
+      user = await super().aget_user(user_id)
+      if user is not None:
+        await cache.aset(user_key(user_id), user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Warning, register
+
+from advanced_todo_list.caches import is_shared
+
+CACHED_SESSION_ENGINES = ('django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db')
+
+
+@register()
+def check_session_cache(app_configs, **kwargs):
+  if settings.SESSION_ENGINE not in CACHED_SESSION_ENGINES or is_shared(caches[settings.SESSION_CACHE_ALIAS]):
+    return []
+  return [Warning(
+    'Sessions are cached in a local-memory cache.',
+    hint='A logout only clears the session in the worker that served it; the other workers keep accepting '
+         'it from their own cache. Use a shared SESSION_CACHE_BACKEND, or run a single process.',
+    id='users.W001',
+  )]
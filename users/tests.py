@@ -1,9 +1,18 @@
+import os
+import tempfile
 from django.apps import apps
 from django.contrib import auth
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils.http import urlencode
 from users.apps import UsersConfig
+from users.backends import user_key
+from users.checks import check_session_cache
+from todos.models import Todo
 from common.constants import LOGIN_URL, REGISTER_URL, DASHBOARD_URL, LOGOUT_URL, LOGIN_TEMPLATE, REGISTER_TEMPLATE, TODOS_URL, DASHBOARD_TEMPLATE
 
 # Create your tests here.
@@ -163,4 +172,69 @@ class DashboardPageTest(TestCase):
     response = self.client.get(DASHBOARD_URL)
     self.assertEqual(response.status_code, 302)
     login_url_with_next = f"{LOGIN_URL}?{urlencode({'next': DASHBOARD_URL})}"
-    self.assertRedirects(response, login_url_with_next)  
\ No newline at end of file
+    self.assertRedirects(response, login_url_with_next)  
+
+  def test_dashboard_shows_todo_statistics(self):
+    user = create_test_user()
+    Todo.objects.create(title='First', user=user, status='Completed')
+    Todo.objects.create(title='Second', user=user, priority='High')
+    self.client.login(username='testuser', password='testpass123')
+
+    response = self.client.get(DASHBOARD_URL)
+    self.assertEqual(response.context['stats']['total'], 2)
+    self.assertEqual(response.context['stats']['completed'], 1)
+    self.assertContains(response, '2 todos')
+
+SHARED_SESSION_CACHE = {
+  'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+  'todo_fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'todo-fragments'},
+  'sessions': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+               'LOCATION': os.path.join(tempfile.gettempdir(), 'atlas-test-sessions')},
+}
+
+@override_settings(CACHES=SHARED_SESSION_CACHE)
+class CachedUserTest(TestCase):
+  def setUp(self):
+    caches['sessions'].clear()
+    self.user = create_test_user()
+    self.client.login(username='testuser', password='testpass123')
+
+  def tables_read(self):
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(reverse('todos:check_active_timer'))
+    self.assertEqual(response.status_code, 200)
+    return ' '.join(query['sql'] for query in queries)
+
+  def test_user_is_read_from_the_cache(self):
+    self.assertIn('"auth_user"', self.tables_read())
+    self.assertNotIn('"auth_user"', self.tables_read())
+
+  def test_password_change_logs_out_other_sessions(self):
+    self.tables_read()
+    self.user.set_password('another-pass-456')
+    self.user.save()
+    response = self.client.get(reverse('todos:check_active_timer'))
+    self.assertEqual(response.status_code, 302)
+
+  def test_logout_drops_the_user(self):
+    self.tables_read()
+    self.client.get(LOGOUT_URL)
+    self.assertIsNone(caches['sessions'].get(user_key(self.user.pk)))
+
+  @override_settings(CACHES={**SHARED_SESSION_CACHE, 'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+  def test_local_memory_cache_is_not_used(self):
+    self.tables_read()
+    self.assertIn('"auth_user"', self.tables_read())
+
+  @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+  def test_signed_cookie_sessions_need_no_query(self):
+    self.client.login(username='testuser', password='testpass123')
+    self.tables_read()
+    sql = self.tables_read()
+    self.assertNotIn('django_session', sql)
+    self.assertNotIn('"auth_user"', sql)
+
+  @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+                     CACHES={**SHARED_SESSION_CACHE, 'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+  def test_cached_sessions_in_local_memory_are_flagged(self):
+    self.assertEqual([warning.id for warning in check_session_cache(None)], ['users.W001'])
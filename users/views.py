@@ -5,6 +5,7 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from common.constants import TODOS_URL
+from todos.stats import get_todo_stats
 
 
 # Create your views here.
@@ -41,7 +42,7 @@ def register_view(request):
 
 @login_required
 def dashboard_view(request):
-  return render(request, 'users/dashboard.html')
+  return render(request, 'users/dashboard.html', {'stats': get_todo_stats(request.user)})
 
 def logout_view(request):
   logout(request)